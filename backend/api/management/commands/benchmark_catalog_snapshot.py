@@ -0,0 +1,92 @@
+import gzip
+from timeit import default_timer
+
+import brotli
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.v1.serializers import IngredientSerializer
+from api.v1.snapshots import CatalogSnapshot
+from recipes.benchmarks import benchmark_catalog, load_catalog, measure
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    """
+    Замеряет построение снимка справочника ингредиентов и отдачу
+    списка из снимка в сравнении с сериализацией через DRF.
+    Данные загружаются в транзакции и откатываются, справочник
+    ингредиентов в базе должен быть пуст.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            action='append',
+            dest='sizes',
+            help='Размер каталога (можно указать несколько раз). '
+                 'По умолчанию: CSV и 100 000 строк.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество повторов отдачи списка',
+        )
+
+    def handle(self, *args, **options):
+        for size in options['sizes'] or [0, 100_000]:
+            catalog = load_catalog(size)
+            with benchmark_catalog(catalog):
+                self.benchmark(catalog, options['repeat'])
+
+    def benchmark(self, catalog, repeat):
+        fields = IngredientSerializer.Meta.fields
+        start = default_timer()
+        rows = list(Ingredient.objects.values(*fields))
+        query_time = default_timer() - start
+        start = default_timer()
+        body = JSONRenderer().render(rows)
+        render_time = default_timer() - start
+        start = default_timer()
+        gzip.compress(body, compresslevel=settings.SNAPSHOT_GZIP_LEVEL)
+        gzip_time = default_timer() - start
+        start = default_timer()
+        brotli.compress(body, quality=settings.SNAPSHOT_BROTLI_QUALITY)
+        brotli_time = default_timer() - start
+        start = default_timer()
+        snapshot = CatalogSnapshot(rows)
+        build_time = default_timer() - start
+        sizes = ', '.join(
+            f'{encoding or "json"} {len(content) / 1024:.0f} КБ'
+            for encoding, (content, _) in snapshot.variants.items()
+        )
+        self.stdout.write(
+            f'Каталог: {len(catalog)} строк, {sizes}\n'
+            f'  выборка {query_time:.3f} с, JSON {render_time:.3f} с, '
+            f'gzip {gzip_time:.3f} с, brotli {brotli_time:.3f} с, '
+            f'снимок целиком {build_time:.3f} с'
+        )
+        factory = RequestFactory()
+        for encoding in ('identity', 'gzip', 'br'):
+            request = factory.get(
+                '/api/ingredients/', HTTP_ACCEPT_ENCODING=encoding
+            )
+            request.user = AnonymousUser()
+            snapshot_time = measure(
+                lambda: snapshot.response(request), repeat
+            )
+            self.stdout.write(
+                f'  из снимка ({encoding}): {snapshot_time:.0f} мкс'
+            )
+        drf_time = measure(
+            lambda: JSONRenderer().render(
+                IngredientSerializer(Ingredient.objects.all(), many=True).data
+            ),
+            max(1, repeat // 10),
+        )
+        self.stdout.write(f'  через DRF: {drf_time:.0f} мкс')
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+
+from .v1.cache import invalidate_all_recipes, invalidate_recipes
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """Сброс кэша при изменении рецепта."""
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """Сброс кэша при изменении ингредиентов рецепта."""
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Сброс кэша при изменении тегов или ингредиентов рецепта."""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_recipes([instance.pk])
+    elif pk_set:
+        invalidate_recipes(pk_set)
+    else:
+        invalidate_all_recipes()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    """Теги и ингредиенты входят во многие рецепты - сбрасываем весь кэш."""
+    invalidate_all_recipes()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    """
+    Сброс кэша рецептов автора при изменении его данных. Дата
+    изменения рецептов тоже обновляется: от нее зависит их ETag.
+    """
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    invalidate_recipes(instance.recipes.values_list('pk', flat=True))
+    instance.recipes.update(updated_at=timezone.now())
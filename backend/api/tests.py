@@ -0,0 +1,287 @@
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient, APITestCase
+
+from api.v1.serializers import WriteRecipeSerializer
+from recipes.models import (
+    Favorite, Ingredient, IngredientInRecipe, Recipe, ShoppingCart, Tag
+)
+from users.authentication import token_cache
+from users.models import Subscribe, User
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x00\xff\x00,\x00\x00\x00\x00'
+    b'\x01\x00\x01\x00\x00\x02\x00;'
+)
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com',
+        username=f'user{number}',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password-123',
+    )
+
+
+def create_recipes(authors, count, tags, ingredients):
+    """Рецепты с двумя тегами и тремя ингредиентами у каждого."""
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=authors[number % len(authors)],
+            name=f'Рецепт {number}',
+            text='Описание',
+            cooking_time=10 + number,
+            image=SimpleUploadedFile(
+                f'recipe{number}.gif', GIF, content_type='image/gif'
+            ),
+        )
+        recipe.tags.set(tags[:2])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients[number % 2:number % 2 + 3]
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeQueryCountTests(APITestCase):
+    """
+    Число запросов списка и страницы рецепта не зависит от размера
+    страницы. Кэши представлений и токенов очищаются перед каждым
+    тестом, поэтому считаются запросы при пустом кэше.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *cls.authors = [create_user(number) for number in range(3)]
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}',
+                               color=f'#00000{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(5)
+        ]
+        cls.recipes = create_recipes(cls.authors, 30, tags, ingredients)
+        for recipe in cls.recipes[::3]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscribe.objects.create(user=cls.user, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+
+    def assert_list_queries(self, queries, limit):
+        with self.assertNumQueries(queries):
+            response = self.client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return response
+
+    def test_anonymous_list(self):
+        # count, страница, теги, состав, ингредиенты, авторы.
+        for limit in (6, 30):
+            with self.subTest(limit=limit):
+                cache.clear()
+                self.assert_list_queries(6, limit)
+
+    def test_authenticated_list(self):
+        # Плюс по запросу на избранное, корзину и подписки.
+        self.client.force_authenticate(self.user)
+        for limit in (6, 30):
+            with self.subTest(limit=limit):
+                cache.clear()
+                response = self.assert_list_queries(9, limit)
+                favorited = {
+                    item['id'] for item in response.data['results']
+                    if item['is_favorited']
+                }
+                self.assertEqual(favorited, set(
+                    Favorite.objects.filter(
+                        user=self.user,
+                        recipe_id__in=[
+                            item['id'] for item in response.data['results']
+                        ]
+                    ).values_list('recipe_id', flat=True)
+                ))
+
+    def test_cached_list(self):
+        # Общая часть из кэша: count, страница и флаги пользователя.
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/recipes/', {'limit': 30})
+        for limit in (6, 30):
+            with self.subTest(limit=limit):
+                self.assert_list_queries(5, limit)
+
+    def test_detail(self):
+        recipe = self.recipes[0]
+        url = f'/api/recipes/{recipe.id}/'
+        # Рецепт, версии справочников, теги, состав, ингредиенты, автор.
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(9):
+            response = self.client.get(url)
+        self.assertTrue(response.data['is_favorited'])
+        self.assertTrue(response.data['is_in_shopping_cart'])
+        self.assertEqual(
+            response.data['author']['is_subscribed'],
+            recipe.author == self.authors[0]
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CursorPaginationTests(APITestCase):
+    """Курсорная пагинация не меняет порядок выборки молча."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipes = create_recipes([create_user(0)], 3, [], [])
+
+    def get(self, **params):
+        return self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'limit': 2, **params}
+        )
+
+    def test_default_ordering(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [recipe.id for recipe in reversed(self.recipes)][:2]
+        )
+        self.assertIsNotNone(response.data['next'])
+
+    def test_ranked_ordering(self):
+        for params in (
+            {'ordering': 'popular'},
+            {'ordering': 'trending'},
+            {'search': 'Рецепт'},
+        ):
+            with self.subTest(**params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('pagination', response.data)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeCounterTests(APITestCase):
+    """
+    Сохранение рецепта, загруженного до изменения счетчиков,
+    не возвращает счетчикам старые значения.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = create_user(0), create_user(1)
+        cls.recipe = create_recipes([cls.author], 1, [], [])[0]
+
+    def add_favorite_and_cart(self):
+        self.client.force_authenticate(self.user)
+        for action in ('favorite', 'shopping_cart'):
+            response = self.client.post(
+                f'/api/recipes/{self.recipe.id}/{action}/'
+            )
+            self.assertEqual(response.status_code, 201)
+
+    def assert_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual((recipe.favorites_count, recipe.cart_count), (1, 1))
+        return recipe
+
+    def test_serializer_update(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.add_favorite_and_cart()
+        serializer = WriteRecipeSerializer(
+            stale, data={'name': 'Новое название'}, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(self.assert_counters().name, 'Новое название')
+
+    def test_full_save(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.add_favorite_and_cart()
+        stale.cooking_time = 99
+        stale.save()
+        self.assertEqual(self.assert_counters().cooking_time, 99)
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'Нужна БД с конкурентными транзакциями и INSERT ... ON CONFLICT'
+)
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ConcurrentUserRecipeTests(TransactionTestCase):
+    """
+    Одновременные повторные добавления и удаления: ровно один запрос
+    проходит, остальные получают 400, ошибок 500 нет.
+    """
+
+    workers = 8
+
+    def setUp(self):
+        self.user, self.author = create_user(0), create_user(1)
+        self.recipe = create_recipes([self.author], 1, [], [])[0]
+
+    def request(self, method, url, barrier):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        barrier.wait()
+        try:
+            return getattr(client, method)(url).status_code
+        finally:
+            connection.close()
+
+    def race(self, method, url):
+        barrier = Barrier(self.workers)
+        with ThreadPoolExecutor(self.workers) as executor:
+            return sorted(executor.map(
+                lambda _: self.request(method, url, barrier),
+                range(self.workers)
+            ))
+
+    def assert_race(self, url):
+        self.assertEqual(
+            self.race('post', url), [201] + [400] * (self.workers - 1)
+        )
+        self.assertEqual(
+            self.race('delete', url), [204] + [400] * (self.workers - 1)
+        )
+
+    def test_favorite(self):
+        self.assert_race(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_shopping_cart(self):
+        self.assert_race(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_subscribe(self):
+        self.assert_race(f'/api/users/{self.author.id}/subscribe/')
+        self.assertFalse(Subscribe.objects.exists())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+RECIPE_VERSION_KEY = 'recipes:version'
+
+
+def get_recipe_cache_version():
+    """Версия кэша рецептов: меняется при правке тегов и ингредиентов."""
+    version = cache.get(RECIPE_VERSION_KEY)
+    if version is None:
+        cache.add(RECIPE_VERSION_KEY, 1, timeout=None)
+        version = cache.get(RECIPE_VERSION_KEY, 1)
+    return version
+
+
+def get_recipe_cache_key(recipe_id, version):
+    return f'recipes:{version}:{recipe_id}'
+
+
+def get_cached_recipes(recipe_ids):
+    """Возвращает словарь {id: общая часть представления} из кэша."""
+    version = get_recipe_cache_version()
+    keys = {
+        get_recipe_cache_key(recipe_id, version): recipe_id
+        for recipe_id in recipe_ids
+    }
+    return {
+        keys[key]: value
+        for key, value in cache.get_many(list(keys)).items()
+    }
+
+
+def set_cached_recipes(representations):
+    """Сохраняет общую часть представления рецептов в кэш."""
+    version = get_recipe_cache_version()
+    cache.set_many(
+        {
+            get_recipe_cache_key(recipe_id, version): data
+            for recipe_id, data in representations.items()
+        },
+        timeout=settings.RECIPE_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_recipes(recipe_ids):
+    """Сбрасывает кэш рецептов после фиксации транзакции."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    def delete():
+        version = get_recipe_cache_version()
+        cache.delete_many([
+            get_recipe_cache_key(recipe_id, version)
+            for recipe_id in recipe_ids
+        ])
+
+    transaction.on_commit(delete)
+
+
+def invalidate_all_recipes():
+    """Сбрасывает кэш всех рецептов сменой версии."""
+
+    def bump():
+        get_recipe_cache_version()
+        try:
+            cache.incr(RECIPE_VERSION_KEY)
+        except ValueError:
+            cache.add(RECIPE_VERSION_KEY, 1, timeout=None)
+
+    transaction.on_commit(bump)
@@ -0,0 +1,91 @@
+from functools import partial
+from hashlib import md5
+
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date
+
+from recipes.catalog import get_catalog_versions
+
+
+def make_etag(*parts):
+    """Сильный ETag из частей, от которых зависит ответ."""
+    digest = md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def get_catalog_state(*names):
+    """Версии справочников names и время их последнего изменения."""
+    versions = get_catalog_versions(*names)
+    dates = [date for _, date in versions.values() if date is not None]
+    return (
+        [version for version, _ in versions.values()],
+        int(max(dates).timestamp()) if dates else None
+    )
+
+
+def set_cache_headers(request, response, etag, last_modified=None):
+    """
+    Проставляет ETag, Last-Modified и Cache-Control. Анонимные ответы
+    одинаковы для всех и могут храниться в общем кэше (nginx), ответы
+    пользователю - только в его браузере с проверкой при каждом
+    запросе.
+    """
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.HTTP_CACHE_MAX_AGE
+        )
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def conditional_response(request, etag, last_modified, render):
+    """
+    Отвечает 304, если у клиента актуальная версия ответа,
+    иначе вызывает render. Данные выбираются и сериализуются
+    только во втором случае.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = render()
+    if response.status_code in (200, 304):
+        set_cache_headers(request, response, etag, last_modified)
+    return response
+
+
+class CatalogConditionalGetMixin:
+    """
+    Условный GET для справочников: ETag строится по версиям
+    справочников catalogs, поэтому 304 отдается без единого
+    запроса к самим справочникам.
+    """
+
+    catalogs = ()
+
+    def get_etag(self, request):
+        versions, last_modified = get_catalog_state(*self.catalogs)
+        etag = make_etag(
+            request.accepted_media_type, request.get_full_path(), *versions
+        )
+        return etag, last_modified
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request, *self.get_etag(request),
+            partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request, *self.get_etag(request),
+            partial(super().retrieve, request, *args, **kwargs)
+        )
@@ -0,0 +1,73 @@
+from django.db.models import (
+    BooleanField, Exists, ExpressionWrapper, IntegerField, OuterRef, Q, Sum,
+    Value
+)
+from django.db.models.functions import Cast
+
+from recipes.constants import COOKING_TIME_BUCKETS
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+
+
+RecipeTag = Recipe.tags.through
+
+
+def cooking_time_condition(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(cooking_time__gte=low)
+    if high is not None:
+        condition &= Q(cooking_time__lte=high)
+    return condition
+
+
+def user_recipe_flag(model, user):
+    """Есть ли рецепт в избранном или корзине пользователя."""
+    if not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(model.objects.filter(user=user, recipe=OuterRef('pk')))
+
+
+def get_recipe_facets(queryset, user):
+    """
+    Счетчики для отфильтрованной выборки рецептов: по тегам,
+    по интервалам времени приготовления, в избранном и в корзине.
+    Все счетчики считаются одним запросом: признаки рецепта
+    вычисляются аннотациями 0/1 и суммируются.
+    """
+    tags = list(Tag.objects.values('id', 'name', 'slug'))
+    flags = {
+        f'tag_{tag["id"]}': Exists(
+            RecipeTag.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id=tag['id']
+            )
+        )
+        for tag in tags
+    }
+    flags.update({
+        f'cooking_time_{number}': ExpressionWrapper(
+            cooking_time_condition(low, high), output_field=BooleanField()
+        )
+        for number, (low, high) in enumerate(COOKING_TIME_BUCKETS)
+    })
+    flags['favorited'] = user_recipe_flag(Favorite, user)
+    flags['in_shopping_cart'] = user_recipe_flag(ShoppingCart, user)
+    counts = queryset.order_by().annotate(**{
+        f'facet_{name}': Cast(flag, output_field=IntegerField())
+        for name, flag in flags.items()
+    }).aggregate(**{name: Sum(f'facet_{name}') for name in flags})
+    counts = {name: count or 0 for name, count in counts.items()}
+    return {
+        'tags': [
+            {**tag, 'count': counts[f'tag_{tag["id"]}']} for tag in tags
+        ],
+        'cooking_time': [
+            {
+                'min': low,
+                'max': high,
+                'count': counts[f'cooking_time_{number}'],
+            }
+            for number, (low, high) in enumerate(COOKING_TIME_BUCKETS)
+        ],
+        'is_favorited': counts['favorited'],
+        'is_in_shopping_cart': counts['in_shopping_cart'],
+    }
@@ -0,0 +1,112 @@
+from copy import deepcopy
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_field_names(request, param, allowed):
+    """Список полей из параметра param или None, если его нет."""
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise ValidationError({
+            param: f'Неизвестные поля: {", ".join(sorted(unknown))}'
+        })
+    return names
+
+
+def get_fieldset(request, serializer_class):
+    """
+    Поля ответа из параметров fields и expand: (поля или None, если
+    нужны все, раскрываемые вложенные поля). Поля из expand
+    выводятся, даже если их нет в fields.
+    """
+    allowed = serializer_class.Meta.fields
+    fields = parse_field_names(request, 'fields', allowed)
+    expand = parse_field_names(request, 'expand', allowed) or set()
+    if fields is None:
+        return None, expand
+    return tuple(name for name in allowed if name in fields | expand), expand
+
+
+def get_model_columns(model, fields):
+    """Поля модели, которые нужно загрузить для вывода fields."""
+    columns = {field.name for field in model._meta.concrete_fields}
+    return [name for name in fields if name in columns]
+
+
+class SparseFieldsMixin:
+    """
+    Сериализатор с выборочным набором полей: в контексте fields -
+    поля ответа, expand - вложенные объекты, выводимые целиком.
+    Не раскрытые вложенные объекты заменяются полями из
+    Meta.collapsed_fields, обычно их id. Параметры относятся только
+    к объектам верхнего уровня ответа.
+    """
+
+    @property
+    def sparse_fields(self):
+        top_level = self.root is self or (
+            self.parent is self.root
+            and getattr(self.parent, 'child', None) is self
+        )
+        if not top_level:
+            return None
+        return self.context.get('fields')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.sparse_fields
+        if requested is None:
+            return fields
+        expand = self.context.get('expand', ())
+        collapsed = getattr(self.Meta, 'collapsed_fields', {})
+        return {
+            name: (
+                deepcopy(collapsed[name])
+                if name in collapsed and name not in expand
+                else fields[name]
+            )
+            for name in requested
+        }
+
+    def is_requested(self, name, expanded=False):
+        """Выводится ли поле name (и раскрыто ли оно, если expanded)."""
+        requested = self.sparse_fields
+        if requested is None:
+            return True
+        return name in requested and (
+            not expanded or name in self.context.get('expand', ())
+        )
+
+
+class SparseFieldsetViewMixin:
+    """
+    Передает сериализатору поля из параметров fields и expand
+    для чтения в действиях fieldset_actions.
+    """
+
+    fieldset_actions = ()
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = (None, set())
+            if (
+                self.action in self.fieldset_actions
+                and self.request.method in SAFE_METHODS
+            ):
+                self._fieldset = get_fieldset(
+                    self.request, self.get_serializer_class()
+                )
+        return self._fieldset
+
+    def get_serializer_context(self):
+        fields, expand = self.get_fieldset()
+        return {
+            **super().get_serializer_context(),
+            'fields': fields,
+            'expand': expand,
+        }
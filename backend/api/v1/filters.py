@@ -1,13 +1,35 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import (
     FilterSet,
     ModelMultipleChoiceFilter,
     filters,
 )
 
-from recipes.models import Recipe, Tag, Favorite, ShoppingCart
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.search import search_recipes
+
+from .viewer import get_viewer_state
 
 User = get_user_model()
+RecipeTag = Recipe.tags.through
+
+TAGS_MODE_CHOICES = (
+    ('any', 'Любой из тегов'),
+    ('all', 'Все теги'),
+)
+
+RECIPE_ORDERING_CHOICES = (
+    ('popular', 'Популярные'),
+    ('trending', 'В трендах'),
+)
 
 
 class RecipeFilter(FilterSet):
@@ -17,35 +39,139 @@ class RecipeFilter(FilterSet):
         queryset=Tag.objects.all(),
         field_name='tags__slug',
         to_field_name='slug',
-        label='Tags'
+        label='Tags',
+        method='filter_tags'
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODE_CHOICES,
+        method='filter_tags_mode'
+    )
+    ingredients = ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        method='filter_ingredients'
+    )
+    exclude_ingredients = ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        method='filter_exclude_ingredients'
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    cooking_time__gte = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='gte'
+    )
+    cooking_time__lte = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='lte'
+    )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=RECIPE_ORDERING_CHOICES,
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
         fields = (
             'tags',
+            'tags_mode',
+            'ingredients',
+            'exclude_ingredients',
             'author',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'cooking_time__gte',
+            'cooking_time__lte',
+            'search',
+            'ordering',
         )
 
+    def filter_tags(self, queryset, name, value):
+        """
+        Фильтр по тегам через EXISTS, без соединения с таблицей тегов,
+        поэтому рецепты не повторяются. По умолчанию нужен любой
+        из тегов, при tags_mode=all - все.
+        """
+        if not value:
+            return queryset
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag in value:
+                queryset = queryset.filter(Exists(
+                    RecipeTag.objects.filter(
+                        recipe_id=OuterRef('pk'), tag_id=tag.id
+                    )
+                ))
+            return queryset
+        return queryset.filter(Exists(
+            RecipeTag.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=[tag.id for tag in value]
+            )
+        ))
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Режим учитывается в filter_tags."""
+        return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        """Рецепты, в которых есть все указанные ингредиенты."""
+        for ingredient in value:
+            queryset = queryset.filter(Exists(
+                IngredientInRecipe.objects.filter(
+                    recipe_id=OuterRef('pk'), ingredient_id=ingredient.id
+                )
+            ))
+        return queryset
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        """Рецепты, в которых нет ни одного из указанных ингредиентов."""
+        if not value:
+            return queryset
+        return queryset.exclude(Exists(
+            IngredientInRecipe.objects.filter(
+                recipe_id=OuterRef('pk'),
+                ingredient_id__in=[ingredient.id for ingredient in value]
+            )
+        ))
+
     def filter_is_favorited(self, queryset, name, value):
-        """Фильтр по избранному"""
+        """
+        Фильтр по избранному. После него все рецепты ответа
+        в избранном, и флаг отмечается в загрузчике без запроса.
+        """
         if value:
+            get_viewer_state(self.request).imply('favorites', True)
             favorites = Favorite.objects.filter(
                 user=self.request.user.id).values_list('recipe_id', flat=True)
             return queryset.filter(id__in=favorites)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        """Фильтр по корзине покупок"""
+        """Фильтр по корзине покупок, см. filter_is_favorited."""
         if value:
+            get_viewer_state(self.request).imply('cart', True)
             shopping_carts = ShoppingCart.objects.filter(
                 user=self.request.user.id).values_list('recipe_id', flat=True)
             return queryset.filter(id__in=shopping_carts)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию и описанию с сортировкой по релевантности"""
+        value = value.strip()
+        if value:
+            return search_recipes(queryset, value)
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        """
+        Сортировка по популярности (за все время) или по трендам.
+        В трендах показываются только рецепты с активностью за окно
+        рейтинга, порядок берется из предрассчитанной таблицы.
+        """
+        if value == 'popular':
+            return queryset.order_by('-favorites_count', '-id')
+        if value == 'trending':
+            return queryset.filter(ranking__isnull=False).order_by(
+                '-ranking__trending_score', '-id'
+            )
+        return queryset
@@ -0,0 +1,201 @@
+import csv
+import json
+import os
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+
+from django.conf import settings
+from django.db import connections
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+
+SHOPPING_LIST_TITLE = 'Для выбранных рецептов вам понадобится:'
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер выгрузки списка покупок.
+
+    Выгрузка отдается потоком через stream(), render() используется
+    DRF только для сообщений об ошибках.
+    """
+
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, rows):
+        """Генератор частей файла по строкам (название, ед. изм., кол-во)."""
+        raise NotImplementedError
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в текстовом файле."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, rows):
+        yield f'{SHOPPING_LIST_TITLE}\n'
+        for name, measurement_unit, amount in rows:
+            yield f'\n{name} — {amount} {measurement_unit}'
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for name, measurement_unit, amount in rows:
+            yield writer.writerow((name, amount, measurement_unit))
+
+
+class JSONLinesShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в JSON Lines: по объекту на строку."""
+
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+    extension = 'jsonl'
+
+    def stream(self, rows):
+        for name, measurement_unit, amount in rows:
+            yield json.dumps(
+                {
+                    'name': name,
+                    'amount': amount,
+                    'measurement_unit': measurement_unit,
+                },
+                ensure_ascii=False,
+            ) + '\n'
+
+
+class StreamClosed(Exception):
+    """Клиент перестал читать выгрузку."""
+
+
+class QueueWriter:
+    """Файлоподобный объект, передающий записанные данные через очередь."""
+
+    def __init__(self, queue, closed):
+        self.queue = queue
+        self.closed = closed
+
+    def write(self, data):
+        while not self.closed.is_set():
+            try:
+                self.queue.put(bytes(data), timeout=0.1)
+                return len(data)
+            except Full:
+                continue
+        raise StreamClosed
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """
+    Список покупок в PDF для печати.
+
+    Документ собирается в отдельном потоке, готовые байты передаются
+    в ответ через очередь ограниченного размера.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    extension = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    line_height = 18
+    margin = 56
+    queue_size = 16
+    done = object()
+
+    def get_font(self):
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not os.path.exists(font_path):
+            return 'Helvetica'
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def draw(self, rows, output):
+        font = self.get_font()
+        _, height = A4
+        pdf = canvas.Canvas(output, pagesize=A4)
+        pdf.setTitle('Список покупок')
+        pdf.setFont(font, self.font_size + 2)
+        y = height - self.margin
+        pdf.drawString(self.margin, y, SHOPPING_LIST_TITLE)
+        y -= self.line_height * 2
+        pdf.setFont(font, self.font_size)
+        for name, measurement_unit, amount in rows:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            pdf.drawString(
+                self.margin, y, f'{name} — {amount} {measurement_unit}'
+            )
+            y -= self.line_height
+        pdf.save()
+
+    def stream(self, rows):
+        queue = Queue(maxsize=self.queue_size)
+        closed = Event()
+
+        def work():
+            try:
+                self.draw(rows, QueueWriter(queue, closed))
+            except StreamClosed:
+                return
+            except Exception as error:
+                result = error
+            else:
+                result = self.done
+            finally:
+                connections.close_all()
+            while not closed.is_set():
+                try:
+                    queue.put(result, timeout=0.1)
+                    return
+                except Full:
+                    continue
+
+        Thread(target=work, daemon=True).start()
+        try:
+            while True:
+                try:
+                    chunk = queue.get(timeout=0.1)
+                except Empty:
+                    continue
+                if chunk is self.done:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            closed.set()
@@ -2,7 +2,8 @@ import base64
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
+from django.db import models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -12,22 +13,50 @@ from recipes.models import (
     IngredientInRecipe,
     Recipe,
     Tag,
-    Favorite,
-    ShoppingCart
+    ShoppingListItem
 )
-from users.models import Subscribe
+from recipes.constants import PANTRY_MAX_INGREDIENTS, RECIPE_BATCH_SIZE
+from recipes.pantry import recipes_changed
+from recipes.shopping_list import change_recipe_ingredients
+from recipes.similarity import update_similar_recipes
+from recipes.tasks import run_after_commit
+
+from .cache import get_cached_recipes, set_cached_recipes
+from .fieldsets import SparseFieldsMixin, get_model_columns
+from .viewer import get_viewer_state
 
 
 User = get_user_model()
 
 
-class CustomUserSerializer(UserSerializer):
+def get_viewer(context):
+    """Загрузчик флагов текущего пользователя из контекста."""
+    return context.get('viewer') or get_viewer_state(context['request'])
+
+
+class ViewerStateListSerializer(serializers.ListSerializer):
+    """
+    Списочный сериализатор, который до сериализации регистрирует
+    объекты страницы в загрузчике флагов пользователя, чтобы флаги
+    загрузились одним запросом на всю страницу.
+    """
+
+    def to_representation(self, data):
+        items = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        self.child.prime_viewer_state(items)
+        return super().to_representation(items)
+
+
+class CustomUserSerializer(SparseFieldsMixin, UserSerializer):
     """Переопределение базового сериализатора пользователя (Djoser)."""
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
+        list_serializer_class = ViewerStateListSerializer
         fields = (
             'email',
             'id',
@@ -37,10 +66,20 @@ class CustomUserSerializer(UserSerializer):
             'is_subscribed',
         )
 
+    def prime_viewer_state(self, authors):
+        if not self.is_requested('is_subscribed'):
+            return
+        get_viewer(self.context).prime('subscriptions', (
+            author.id for author in authors
+            if not hasattr(author, 'is_subscribed')
+        ))
+
     def get_is_subscribed(self, author):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.subscriber.filter(author=author).exists())
+        if self.context.get('shared'):
+            return None
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
+        return get_viewer(self.context).has('subscriptions', author.id)
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -92,7 +131,7 @@ class SubscribeSerializer(CustomUserSerializer):
     """Сериализатор подписки."""
 
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(CustomUserSerializer.Meta):
         fields = (
@@ -107,32 +146,34 @@ class SubscribeSerializer(CustomUserSerializer):
             'last_name',
         )
 
-    def validate(self, data):
-        """Валидация."""
-        author = self.instance
-        user = self.context['request'].user
-        if Subscribe.objects.filter(author=author, user=user).exists():
-            raise ValidationError({
-                'errors': 'Вы уже подписаны на этого пользователя'
-            })
-        if user == author:
-            raise ValidationError({
-                'errors': 'Вы не можете подписаться на самого себя'
-            })
-        return data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
-        request = self.context['request']
-        recipes_limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes_limit = get_recipes_limit(self.context['request'])
+            recipes = obj.recipes.all()
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         return ShortRecipeSerializer(recipes, many=True, read_only=True).data
 
 
+class RecipesLimitSerializer(serializers.Serializer):
+    """Сериализатор параметра recipes_limit."""
+
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
+
+
+def get_recipes_limit(request):
+    """
+    Проверенное значение recipes_limit из запроса или None,
+    если ограничения нет. Как и раньше, recipes_limit=0
+    означает отсутствие ограничения.
+    """
+    serializer = RecipesLimitSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data.get('recipes_limit') or None
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     """Сериализатор ингредиента."""
 
@@ -168,8 +209,53 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class ReadRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор чтения рецепта."""
+class ShoppingListItemSerializer(AmountIngredientSerializer):
+    """Сериализатор позиции списка покупок."""
+
+    class Meta(AmountIngredientSerializer.Meta):
+        model = ShoppingListItem
+
+
+class ReadRecipeListSerializer(serializers.ListSerializer):
+    """
+    Списочный сериализатор рецептов: общая для всех пользователей часть
+    представления берется из кэша одним запросом, из БД подгружаются
+    только отсутствующие в кэше рецепты.
+    """
+
+    def to_representation(self, data):
+        recipes = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        if self.child.sparse_fields is not None:
+            self.child.prepare_sparse(recipes)
+            return [
+                super(ReadRecipeSerializer, self.child)
+                .to_representation(recipe)
+                for recipe in recipes
+            ]
+        self.child.prime_viewer_state(recipes)
+        shared = get_cached_recipes(recipe.id for recipe in recipes)
+        missing = [recipe for recipe in recipes if recipe.id not in shared]
+        if missing:
+            rendered = self.child.render_shared(missing)
+            set_cached_recipes(rendered)
+            shared.update(rendered)
+        return [
+            self.child.add_viewer_state(shared[recipe.id], recipe)
+            for recipe in recipes
+        ]
+
+
+class ReadRecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор чтения рецепта.
+
+    Представление собирается из кэшируемой общей части и флагов,
+    зависящих от текущего пользователя. Выборочный набор полей
+    (fields, expand) сериализуется напрямую, без кэша: загружаются
+    только нужные связи.
+    """
 
     tags = TagSerializer(many=True, read_only=True)
     author = CustomUserSerializer(read_only=True)
@@ -180,6 +266,7 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
+        list_serializer_class = ReadRecipeListSerializer
         fields = (
             'id',
             'tags',
@@ -192,20 +279,99 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
             'text',
             'cooking_time',
         )
+        collapsed_fields = {
+            'tags': serializers.PrimaryKeyRelatedField(
+                many=True, read_only=True
+            ),
+            'author': serializers.PrimaryKeyRelatedField(read_only=True),
+            'ingredients': serializers.PrimaryKeyRelatedField(
+                many=True, read_only=True
+            ),
+        }
+
+    def to_representation(self, instance):
+        if self.sparse_fields is not None:
+            self.prepare_sparse([instance])
+            return super().to_representation(instance)
+        shared = get_cached_recipes([instance.id]).get(instance.id)
+        if shared is None:
+            rendered = self.render_shared([instance])
+            set_cached_recipes(rendered)
+            shared = rendered[instance.id]
+        return self.add_viewer_state(shared, instance)
+
+    def render_shared(self, recipes):
+        """
+        Общая часть представления: без флагов пользователя
+        и с относительной ссылкой на изображение.
+        """
+        prefetch_related_objects(
+            recipes, 'tags', 'ingredient_list__ingredient', 'author'
+        )
+        serializer = type(self)(context={'shared': True})
+        return {
+            recipe.id: super(ReadRecipeSerializer, serializer)
+            .to_representation(recipe)
+            for recipe in recipes
+        }
+
+    def prepare_sparse(self, recipes):
+        """Подгружает только связи, которые есть в ответе."""
+        lookups = []
+        if self.is_requested('tags'):
+            lookups.append('tags')
+        if self.is_requested('ingredients', expanded=True):
+            lookups.append('ingredient_list__ingredient')
+        elif self.is_requested('ingredients'):
+            lookups.append('ingredients')
+        if self.is_requested('author', expanded=True):
+            lookups.append(Prefetch('author', User.objects.only(
+                *get_model_columns(User, CustomUserSerializer.Meta.fields)
+            )))
+        prefetch_related_objects(recipes, *lookups)
+        self.prime_viewer_state(recipes)
+
+    def prime_viewer_state(self, recipes):
+        viewer = get_viewer(self.context)
+        recipe_ids = [recipe.id for recipe in recipes]
+        if self.is_requested('is_favorited'):
+            viewer.prime('favorites', recipe_ids)
+        if self.is_requested('is_in_shopping_cart'):
+            viewer.prime('cart', recipe_ids)
+        if self.is_requested('author', expanded=True):
+            viewer.prime('subscriptions', (
+                recipe.author_id for recipe in recipes
+            ))
+
+    def add_viewer_state(self, shared, instance):
+        """Дополняет общую часть флагами текущего пользователя."""
+        viewer = get_viewer(self.context)
+        data = dict(shared)
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        data['author'] = dict(
+            data['author'],
+            is_subscribed=viewer.has('subscriptions', instance.author_id)
+        )
+        if data['image']:
+            data['image'] = self.context['request'].build_absolute_uri(
+                data['image']
+            )
+        return data
 
     def get_ingredients(self, obj):
-        ingredients = IngredientInRecipe.objects.filter(recipe=obj)
+        ingredients = obj.ingredient_list.all()
         return AmountIngredientSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.favorites.filter(recipe=obj).exists())
+        if self.context.get('shared'):
+            return None
+        return get_viewer(self.context).has('favorites', obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.cart.filter(recipe=obj).exists())
+        if self.context.get('shared'):
+            return None
+        return get_viewer(self.context).has('cart', obj.id)
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
@@ -243,29 +409,31 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         )
 
     def validate_ingredients(self, value):
-        """Валидация ингредиентов."""
+        """
+        Валидация ингредиентов. Все ингредиенты загружаются одним
+        запросом и сохраняются в данных для создания рецепта.
+        """
         ingredients = value
         if not ingredients:
             raise ValidationError({
                 'ingredients': 'Нужен хотя бы один ингредиент'
             })
-        ingredients_list = []
+        ids = {item['id'] for item in ingredients}
+        if len(ids) != len(ingredients):
+            raise ValidationError({
+                'ingredients': 'Ингридиенты не могут повторяться'
+            })
+        found = Ingredient.objects.in_bulk(ids)
+        if len(found) != len(ids):
+            raise ValidationError({
+                'ingredients': 'Такого ингредиента нет в базе данных'
+            })
         for item in ingredients:
-            try:
-                ingredient = Ingredient.objects.get(id=item['id'])
-            except Exception:
-                raise ValidationError({
-                    'ingredients': 'Такого ингредиента нет в базе данных'
-                })
-            if ingredient in ingredients_list:
-                raise ValidationError({
-                    'ingredients': 'Ингридиенты не могут повторяться'
-                })
             if int(item['amount']) <= 0:
                 raise ValidationError({
                     'amount': 'Количество ингредиента должно быть больше 0'
                 })
-            ingredients_list.append(ingredient)
+            item['ingredient'] = found[item['id']]
         return value
 
     def validate_tags(self, value):
@@ -273,24 +441,22 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         tags = value
         if not tags:
             raise ValidationError({'tags': 'Нужно выбрать хотя бы один тег'})
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise ValidationError({'tags': 'Теги не должны повторяться'})
-            tags_list.append(tag)
+        if len(set(tags)) != len(tags):
+            raise ValidationError({'tags': 'Теги не должны повторяться'})
         return value
 
     def create_ingredients(self, ingredients, recipe):
         """Присваивание ингредиентов рецепту."""
         IngredientInRecipe.objects.bulk_create(
             IngredientInRecipe(
-                ingredient=get_object_or_404(Ingredient, id=ingredient['id']),
+                ingredient=ingredient['ingredient'],
                 recipe=recipe,
                 amount=ingredient['amount']
             )
             for ingredient in ingredients
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создание."""
         tags = validated_data.pop('tags')
@@ -298,28 +464,80 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        recipes_changed([recipe.id])
+        run_after_commit(update_similar_recipes, recipe.id)
         return recipe
 
+    def update_tags(self, recipe, tags):
+        """
+        Добавляет и удаляет только изменившиеся теги.
+        Возвращает True, если набор тегов изменился.
+        """
+        current = set(recipe.tags.values_list('id', flat=True))
+        requested = {tag.id for tag in tags}
+        if current - requested:
+            recipe.tags.remove(*(current - requested))
+        if requested - current:
+            recipe.tags.add(*(requested - current))
+        return current != requested
+
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Применяет к ингредиентам рецепта только разницу
+        между текущим и новым составом. Возвращает True,
+        если изменился набор ингредиентов.
+        """
+        current = {
+            row.ingredient_id: row for row in recipe.ingredient_list.all()
+        }
+        deltas = {}
+        changed = []
+        created = []
+        for item in ingredients:
+            row = current.pop(item['id'], None)
+            if row is None:
+                created.append(IngredientInRecipe(
+                    ingredient=item['ingredient'],
+                    recipe=recipe,
+                    amount=item['amount']
+                ))
+                deltas[item['id']] = item['amount']
+            elif row.amount != item['amount']:
+                deltas[item['id']] = item['amount'] - row.amount
+                row.amount = item['amount']
+                changed.append(row)
+        for ingredient_id, row in current.items():
+            deltas[ingredient_id] = -row.amount
+        if current:
+            IngredientInRecipe.objects.filter(
+                id__in=[row.id for row in current.values()]
+            ).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        if created:
+            IngredientInRecipe.objects.bulk_create(created)
+        change_recipe_ingredients(recipe.id, deltas)
+        if current or created:
+            recipes_changed([recipe.id])
+            return True
+        return False
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновление."""
-        try:
-            tags = validated_data.pop('tags')
-        except Exception:
-            raise ValidationError({
-                'tags': 'Нужно выбрать хотя бы один тег'
-            })
-        try:
-            ingredients = validated_data.pop('ingredients')
-        except Exception:
-            raise ValidationError({
-                'ingredients': 'Нужно выбрать хотя бы один ингредиент'
-            })
+        """
+        Обновление. При частичном обновлении (PATCH) не переданные
+        теги и ингредиенты остаются без изменений.
+        """
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.ingredients.clear()
-        instance.tags.set(tags)
-        self.create_ingredients(ingredients, instance)
-        instance.save()
+        changed = False
+        if tags is not None:
+            changed |= self.update_tags(instance, tags)
+        if ingredients is not None:
+            changed |= self.update_ingredients(instance, ingredients)
+        if changed:
+            run_after_commit(update_similar_recipes, instance.id)
         return instance
 
     def to_representation(self, instance):
@@ -328,32 +546,26 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         return ReadRecipeSerializer(instance, context=context).data
 
 
-class AbstractSerializer(serializers.ModelSerializer):
-    """Абстрактный сериализатор для корзины и избранного."""
-
-    class Meta:
-        abstract = True
-
-    def validate(self, data):
-        """Валидация повторного добавления."""
-        user = data.get('user')
-        recipe = data.get('recipe')
-        if self.Meta.model.objects.filter(user=user, recipe=recipe).exists():
-            raise ValidationError({'error': 'Рецепт уже добавлен.'})
-        return data
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
 
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BATCH_SIZE,
+    )
 
-class ShoppingCartSerializer(AbstractSerializer):
-    """Сериализатор корзины."""
+    def validate_recipes(self, value):
+        """Убираем повторы, сохраняя порядок."""
+        return list(dict.fromkeys(value))
 
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
 
+class PantrySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
 
-class FavoriteSerializer(AbstractSerializer):
-    """Сериализатор избранного."""
-
-    class Meta:
-        model = Favorite
-        fields = ('user', 'recipe')
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=PANTRY_MAX_INGREDIENTS,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
@@ -0,0 +1,150 @@
+import gzip
+from hashlib import md5
+from threading import Lock
+
+import brotli
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from recipes.catalog import get_catalog_versions
+from recipes.constants import INGREDIENTS_CATALOG, TAGS_CATALOG
+from recipes.models import Ingredient, Tag
+
+from .conditional import conditional_response
+from .serializers import IngredientSerializer, TagSerializer
+
+
+ENCODINGS = ('br', 'gzip')
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, которые клиент не запретил (q=0)."""
+    accepted = set()
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        quality = params.strip().partition('q=')[2]
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class CatalogSnapshot:
+    """
+    Готовый ответ со всем справочником: JSON, сжатый gzip и brotli.
+    Сжатие выполняется один раз при построении снимка. ETag считается
+    по содержимому, поэтому совпадает во всех процессах; у сжатых
+    вариантов он свой, так как отличаются байты ответа.
+    """
+
+    def __init__(self, rows, last_modified=None):
+        body = JSONRenderer().render(rows)
+        self.last_modified = last_modified
+        etag = f'"{md5(body).hexdigest()}"'
+        self.variants = {
+            None: (body, etag),
+            'gzip': (
+                gzip.compress(
+                    body, compresslevel=settings.SNAPSHOT_GZIP_LEVEL, mtime=0
+                ),
+                f'{etag[:-1]}-gzip"'
+            ),
+            'br': (
+                brotli.compress(
+                    body, quality=settings.SNAPSHOT_BROTLI_QUALITY
+                ),
+                f'{etag[:-1]}-br"'
+            ),
+        }
+
+    def response(self, request):
+        """Ответ в лучшей из поддерживаемых клиентом кодировок."""
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        encoding = next(
+            (encoding for encoding in ENCODINGS if encoding in accepted),
+            None
+        )
+        body, etag = self.variants[encoding]
+
+        def render():
+            response = HttpResponse(body, content_type='application/json')
+            if encoding:
+                response['Content-Encoding'] = encoding
+            return response
+
+        response = conditional_response(
+            request, etag, self.last_modified, render
+        )
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+class CatalogSnapshotCache:
+    """
+    Снимок справочника, перестраиваемый при смене его версии.
+    Пока один поток перестраивает снимок, остальные отдают
+    предыдущий.
+    """
+
+    def __init__(self, catalog, queryset, serializer_class):
+        self.catalog = catalog
+        self.queryset = queryset
+        self.fields = serializer_class.Meta.fields
+        self.lock = Lock()
+        self.version = None
+        self.snapshot = None
+
+    def build(self, version, updated_at):
+        # Поля сериализатора - простые поля модели, поэтому values()
+        # совпадает с его представлением и строится намного быстрее.
+        self.snapshot = CatalogSnapshot(
+            list(self.queryset.values(*self.fields)),
+            int(updated_at.timestamp()) if updated_at else None
+        )
+        self.version = version
+
+    def get(self):
+        version, updated_at = get_catalog_versions(self.catalog)[
+            self.catalog
+        ]
+        if version == self.version:
+            return self.snapshot
+        if self.lock.acquire(blocking=self.snapshot is None):
+            try:
+                if version != self.version:
+                    self.build(version, updated_at)
+            finally:
+                self.lock.release()
+        return self.snapshot
+
+
+ingredients_snapshot = CatalogSnapshotCache(
+    INGREDIENTS_CATALOG, Ingredient.objects.all(), IngredientSerializer
+)
+tags_snapshot = CatalogSnapshotCache(
+    TAGS_CATALOG, Tag.objects.all(), TagSerializer
+)
+
+
+class SnapshotListMixin:
+    """
+    Список без параметров отдается из снимка справочника
+    в памяти, минуя ORM и рендереры DRF.
+    """
+
+    snapshot = None
+
+    def list(self, request, *args, **kwargs):
+        if (
+            request.query_params
+            or not isinstance(request.accepted_renderer, JSONRenderer)
+        ):
+            return super().list(request, *args, **kwargs)
+        return self.snapshot.get().response(request)
@@ -0,0 +1,70 @@
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscribe
+
+
+class ViewerState:
+    """
+    Связи текущего пользователя с объектами ответа: избранное,
+    корзина и подписки. Загрузчик в духе DataLoader: сериализаторы
+    сначала регистрируют id объектов страницы (prime), а при первом
+    обращении к флагу все зарегистрированные id загружаются одним
+    запросом на связь. Хранятся только флаги объектов, встретившихся
+    в запросе, поэтому память не зависит от размера избранного.
+    """
+
+    RELATIONS = {
+        'favorites': (Favorite, 'recipe_id'),
+        'cart': (ShoppingCart, 'recipe_id'),
+        'subscriptions': (Subscribe, 'author_id'),
+    }
+
+    def __init__(self, user):
+        self.user = user
+        self.pending = {name: set() for name in self.RELATIONS}
+        self.loaded = {name: {} for name in self.RELATIONS}
+        self.implied = {}
+
+    def prime(self, relation, ids):
+        """Отмечает id, флаги которых понадобятся."""
+        if self.user.is_authenticated and relation not in self.implied:
+            loaded = self.loaded[relation]
+            self.pending[relation].update(
+                pk for pk in ids if pk not in loaded
+            )
+
+    def imply(self, relation, value):
+        """
+        Флаг известен для всех объектов ответа без запроса, например
+        после фильтра is_favorited=1.
+        """
+        self.implied[relation] = value
+
+    def has(self, relation, pk):
+        """Связан ли пользователь с объектом pk."""
+        if not self.user.is_authenticated:
+            return False
+        if relation in self.implied:
+            return self.implied[relation]
+        loaded = self.loaded[relation]
+        if pk not in loaded:
+            self.pending[relation].add(pk)
+            self.load(relation)
+        return loaded[pk]
+
+    def load(self, relation):
+        ids = self.pending[relation]
+        self.pending[relation] = set()
+        model, field = self.RELATIONS[relation]
+        found = set(
+            model.objects.filter(user=self.user, **{f'{field}__in': ids})
+            .values_list(field, flat=True)
+        )
+        self.loaded[relation].update((pk, pk in found) for pk in ids)
+
+
+def get_viewer_state(request):
+    """Состояние текущего пользователя, общее для всего запроса."""
+    state = getattr(request, 'viewer_state', None)
+    if state is None:
+        state = request.viewer_state = ViewerState(request.user)
+    return state
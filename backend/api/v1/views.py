@@ -1,37 +1,80 @@
-from django.db.models import Sum
-from django.shortcuts import HttpResponse, get_object_or_404
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from recipes.catalog import ingredient_index
+from recipes.constants import (
+    INGREDIENTS_CATALOG,
+    SIMILAR_RECIPES_COUNT,
+    TAGS_CATALOG,
+)
+from recipes.feed import feed_recipe_ids
+from recipes.pantry import pantry_index
+from recipes.user_recipes import add_user_recipes, remove_user_recipes
 from recipes.models import (
     Favorite,
     Ingredient,
-    IngredientInRecipe,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
+    SimilarRecipe,
     Tag,
 )
-from users.pagination import CustomPageNumberPagination
+from users.pagination import (
+    CursorPaginationMixin,
+    CustomPageNumberPagination,
+    IdCursorPagination,
+)
 
+from .conditional import (
+    CatalogConditionalGetMixin,
+    conditional_response,
+    get_catalog_state,
+    make_etag,
+)
+from .facets import get_recipe_facets
+from .fieldsets import SparseFieldsetViewMixin, get_model_columns
 from .filters import RecipeFilter
 from .permissions import RecipePermission
+from .renderers import (
+    CSVShoppingListRenderer,
+    JSONLinesShoppingListRenderer,
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer,
+)
 from .serializers import (
     IngredientSerializer,
+    PantrySerializer,
     ReadRecipeSerializer,
     TagSerializer,
     WriteRecipeSerializer,
-    ShoppingCartSerializer,
-    FavoriteSerializer,
-    ShortRecipeSerializer
+    RecipeIdsSerializer,
+    ShortRecipeSerializer,
+    ShoppingListItemSerializer
 )
+from .snapshots import (
+    SnapshotListMixin,
+    ingredients_snapshot,
+    tags_snapshot,
+)
+from .viewer import get_viewer_state
+
 
+SHOPPING_LIST_CHUNK_SIZE = 500
+READ_ACTIONS = ('retrieve', 'list', 'feed', 'similar', 'pantry')
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(SnapshotListMixin, CatalogConditionalGetMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вьюсет ингредиентов."""
 
+    catalogs = (INGREDIENTS_CATALOG,)
+    snapshot = ingredients_snapshot
     serializer_class = IngredientSerializer
     pagination_class = None
 
@@ -44,23 +87,124 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
             )
         return Ingredient.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по параметру name выполняется по индексу в памяти:
+        сначала ингредиенты, название которых начинается с name,
+        затем содержащие name.
+        """
+        if 'name' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return conditional_response(
+            request, *self.get_etag(request),
+            lambda: self.search(request.query_params['name'])
+        )
+
+    def search(self, value):
+        rows = ingredient_index.get().search(value)
+        ingredients = [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for pk, name, measurement_unit in rows
+        ]
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(SnapshotListMixin, CatalogConditionalGetMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Вьюсет тегов."""
 
+    catalogs = (TAGS_CATALOG,)
+    snapshot = tags_snapshot
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SparseFieldsetViewMixin, CursorPaginationMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет рецептов."""
 
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.defer('search_vector')
     pagination_class = CustomPageNumberPagination
     permission_classes = [RecipePermission]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    lookup_value_regex = r'\d+'
+    fieldset_actions = READ_ACTIONS
+
+    def get_queryset(self):
+        """
+        С параметром fields загружаются только выводимые поля
+        рецепта; автор и дата изменения нужны для флагов и ETag.
+        """
+        queryset = super().get_queryset()
+        fields, _ = self.get_fieldset()
+        if fields is None:
+            return queryset
+        return queryset.only(
+            'id', 'author', 'updated_at', *get_model_columns(Recipe, fields)
+        )
+
+    def get_serializer_context(self):
+        """
+        Флаги текущего пользователя (избранное, корзина, подписки)
+        загружаются пакетно общим для запроса загрузчиком, поэтому
+        число запросов не зависит от размера страницы.
+        """
+        return {
+            **super().get_serializer_context(),
+            'viewer': get_viewer_state(self.request),
+        }
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список рецептов. С параметром facets=1 в ответ добавляются
+        счетчики по тегам, времени приготовления, избранному
+        и корзине для текущего фильтра.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = get_recipe_facets(
+                queryset, request.user
+            )
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Рецепт с условным GET. ETag зависит от даты изменения рецепта,
+        версий справочников тегов и ингредиентов и флагов текущего
+        пользователя, поэтому 304 отдается без сериализации.
+        """
+        recipe = self.get_object()
+        viewer = get_viewer_state(request)
+        viewer.prime('favorites', [recipe.id])
+        viewer.prime('cart', [recipe.id])
+        viewer.prime('subscriptions', [recipe.author_id])
+        versions, catalogs_modified = get_catalog_state(
+            TAGS_CATALOG, INGREDIENTS_CATALOG
+        )
+        etag = make_etag(
+            request.accepted_media_type, request.get_full_path(), recipe.id,
+            recipe.updated_at.isoformat(), *versions,
+            viewer.has('favorites', recipe.id),
+            viewer.has('cart', recipe.id),
+            viewer.has('subscriptions', recipe.author_id)
+        )
+        last_modified = None
+        if not request.user.is_authenticated:
+            # Флаги пользователя не меняют дату изменения рецепта,
+            # поэтому Last-Modified отдается только анонимным ответам.
+            last_modified = max(
+                int(recipe.updated_at.timestamp()), catalogs_modified or 0
+            )
+        return conditional_response(
+            request, etag, last_modified,
+            lambda: Response(self.get_serializer(recipe).data)
+        )
 
     def perform_create(self, serializer):
         """Сохраняем автора рецепта."""
@@ -72,36 +216,151 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def get_serializer_class(self):
         """В зависимости от запроса возвращаем Read или Write сериализатор"""
-        if self.action in ('retrieve', 'list'):
+        if self.action in READ_ACTIONS:
             return ReadRecipeSerializer
         return WriteRecipeSerializer
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            TextShoppingListRenderer,
+            CSVShoppingListRenderer,
+            JSONLinesShoppingListRenderer,
+            PDFShoppingListRenderer,
+        ]
+    )
     def download_shopping_cart(self, request):
-        """Скачать корзину."""
+        """
+        Скачать корзину. Формат выбирается параметром format
+        (txt, csv, jsonl, pdf) или заголовком Accept.
+        """
         user = request.user
+        renderer = request.accepted_renderer
         ingredients = (
-            IngredientInRecipe.objects.filter(recipe__cart__user=user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
+            ShoppingListItem.objects.filter(user=user)
+            .values_list(
+                'ingredient__name', 'ingredient__measurement_unit', 'amount'
+            )
             .order_by('ingredient__name')
-            .annotate(amount=Sum('amount'))
-        )
-        shopping_cart = 'Для выбранных рецептов вам понадобится:\n\n'
-        shopping_cart += '\n'.join(
-            [
-                f'{ingredient["ingredient__name"]}'
-                f' — {ingredient["amount"]} '
-                f'{ingredient["ingredient__measurement_unit"]}'
-                for ingredient in ingredients
-            ]
+            .iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
         )
-        response = HttpResponse(
-            shopping_cart, content_type='text.txt; charset=utf-8'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients), content_type=renderer.content_type
         )
-        file_name = f'{user.username}_shopping_list.txt'
+        file_name = f'{user.username}_shopping_list.{renderer.extension}'
         response['Content-Disposition'] = f'attachment; filename={file_name}'
         return response
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь,
+        от новых к старым. Пагинация всегда курсорная.
+        """
+        paginator = IdCursorPagination()
+        recipe_ids = paginator.paginate_ids(
+            lambda before, limit: feed_recipe_ids(
+                request.user.id, before, limit
+            ),
+            request
+        )
+        recipes = self.get_queryset().filter(id__in=recipe_ids)
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk):
+        """
+        Похожие рецепты по общим ингредиентам и тегам,
+        от более похожих к менее. Ответ берется из
+        предрассчитанной таблицы.
+        """
+        scores = dict(
+            SimilarRecipe.objects.filter(recipe_id=pk)
+            .order_by('-score', '-similar_id')
+            .values_list('similar_id', 'score')[:SIMILAR_RECIPES_COUNT]
+        )
+        if not scores:
+            get_object_or_404(Recipe, pk=pk)
+        recipes = sorted(
+            self.get_queryset().filter(id__in=scores),
+            key=lambda recipe: (-scores[recipe.id], -recipe.id)
+        )
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False)
+    def pantry(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов: рецепты, в которых
+        есть хотя бы один из ingredients, начиная с тех, где
+        недостает меньше всего ингредиентов. Подбор идет
+        по инвертированному индексу в памяти.
+        """
+        serializer = PantrySerializer(data={
+            **request.query_params.dict(),
+            'ingredients': request.query_params.getlist('ingredients'),
+        })
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        limit = self.paginator.get_page_size(request)
+        missing = dict(pantry_index.get().search(
+            params['ingredients'], limit, params.get('max_missing')
+        ))
+        positions = {
+            recipe_id: position for position, recipe_id in enumerate(missing)
+        }
+        recipes = sorted(
+            self.get_queryset().filter(id__in=positions),
+            key=lambda recipe: positions[recipe.id]
+        )
+        data = self.get_serializer(recipes, many=True).data
+        for recipe, item in zip(recipes, data):
+            item['missing_ingredients'] = missing[recipe.id]
+        return Response(data)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def shopping_list(self, request):
+        """Список покупок."""
+        items = (
+            ShoppingListItem.objects.filter(user=request.user)
+            .select_related('ingredient')
+            .order_by('ingredient__name')
+        )
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
+
+    @action(
+        methods=['post'],
+        detail=False,
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавить в корзину несколько рецептов."""
+        return self.add_recipes(ShoppingCart, request)
+
+    @shopping_cart_bulk.mapping.delete
+    def shopping_cart_bulk_delete(self, request):
+        """Удалить из корзины несколько рецептов."""
+        return self.delete_recipes(ShoppingCart, request)
+
+    @action(
+        methods=['post'],
+        detail=False,
+        url_path='favorite',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        """Добавить в избранное несколько рецептов."""
+        return self.add_recipes(Favorite, request)
+
+    @favorite_bulk.mapping.delete
+    def favorite_bulk_delete(self, request):
+        """Удалить из избранного несколько рецептов."""
+        return self.delete_recipes(Favorite, request)
+
     @action(
         methods=['post'],
         detail=True,
@@ -109,7 +368,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk):
         """Добавить в корзину."""
-        return self.add_recipe(ShoppingCartSerializer, request, pk)
+        return self.add_recipe(ShoppingCart, request, pk)
 
     @shopping_cart.mapping.delete
     def shopping_cart_delete(self, request, pk):
@@ -123,32 +382,73 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk):
         """Добавить в избранное."""
-        return self.add_recipe(FavoriteSerializer, request, pk)
+        return self.add_recipe(Favorite, request, pk)
 
     @favorite.mapping.delete
     def favorite_delete(self, request, pk):
         """Удалить из избранного."""
         return self.delete_recipe(Favorite, request, pk)
 
-    def add_recipe(self, serializer, request, pk):
-        """Функция добавления в корзину/избранное."""
-        data = {
-            'user': request.user.pk,
-            'recipe': pk,
-        }
-        serializer = serializer(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        try:
-            recipe = Recipe.objects.get(pk=pk)
-        except Exception:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+    def add_recipe(self, model, request, pk):
+        """
+        Функция добавления в корзину/избранное.
+        Повторное добавление отсекает ограничение уникальности в БД.
+        """
+        recipe = Recipe.objects.filter(pk=pk).only(
+            'id', 'name', 'image', 'cooking_time'
+        ).first()
+        if recipe is None:
+            raise ValidationError({'error': 'Такого рецепта не существует.'})
+        if not add_user_recipes(model, request.user.id, [recipe.id]):
+            raise ValidationError({'error': 'Рецепт уже добавлен.'})
         recipe_serializer = ShortRecipeSerializer(recipe)
         return Response(recipe_serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_recipe(self, model, request, pk):
         """Функция удаления из корзины/избранного."""
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        get_object_or_404(model, user=user, recipe=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        if remove_user_recipes(model, request.user.id, [pk]):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, pk=pk)
+        raise ValidationError({'error': 'Рецепт не был добавлен.'})
+
+    def add_recipes(self, model, request):
+        """
+        Пакетное добавление в корзину/избранное.
+        Возвращает результат для каждого id: added, exists или not_found.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        added = set(add_user_recipes(model, request.user.id, recipe_ids))
+        existing = set(
+            Recipe.objects.filter(id__in=set(recipe_ids) - added)
+            .values_list('id', flat=True)
+        ) if len(added) < len(recipe_ids) else set()
+        return Response([
+            {
+                'id': recipe_id,
+                'status': (
+                    'added' if recipe_id in added
+                    else 'exists' if recipe_id in existing
+                    else 'not_found'
+                ),
+            }
+            for recipe_id in recipe_ids
+        ])
+
+    def delete_recipes(self, model, request):
+        """
+        Пакетное удаление из корзины/избранного.
+        Возвращает результат для каждого id: deleted или not_found.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        deleted = set(remove_user_recipes(model, request.user.id, recipe_ids))
+        return Response([
+            {
+                'id': recipe_id,
+                'status': 'deleted' if recipe_id in deleted else 'not_found',
+            }
+            for recipe_id in recipe_ids
+        ])
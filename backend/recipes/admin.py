@@ -6,8 +6,12 @@ from .models import (
     IngredientInRecipe,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
     Tag,
 )
+from .shopping_list import rebuild
+from .similarity import update_similar_recipes
+from .tasks import run_after_commit
 
 
 class RecipeIngredientInline(admin.StackedInline):
@@ -58,9 +62,19 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display_links = ('name',)
     inlines = (RecipeIngredientInline, )
 
+    def save_related(self, request, form, formsets, change):
+        """
+        Пересчитываем списки покупок с этим рецептом
+        и похожие рецепты.
+        """
+        super().save_related(request, form, formsets, change)
+        if change:
+            rebuild(form.instance.cart.values_list('user_id', flat=True))
+        run_after_commit(update_similar_recipes, form.instance.id)
+
     @admin.display(description='Добавлен в избранное')
     def added_to_favorite(self, obj):
-        return f'{obj.favorites.count()}'
+        return f'{obj.favorites_count}'
 
 
 @admin.register(Favorite)
@@ -85,3 +99,17 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'recipe'
     )
     search_fields = ('user',)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    """Конфиг админ-зоны для модели списка покупок."""
+
+    list_display = (
+        'id',
+        'user',
+        'ingredient',
+        'amount'
+    )
+    search_fields = ('user__username',)
+    list_select_related = ('user', 'ingredient')
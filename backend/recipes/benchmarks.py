@@ -0,0 +1,63 @@
+import csv
+from contextlib import contextmanager
+from timeit import default_timer
+
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from .models import Ingredient
+
+
+class Rollback(Exception):
+    """Откат тестовых данных после замеров."""
+
+
+def load_catalog(size):
+    """Ингредиенты из CSV, дополненные синтетическими до size строк."""
+    with open(
+        './data/ingredients.csv', encoding='utf-8', newline=''
+    ) as csvfile:
+        catalog = [tuple(row) for row in csv.reader(csvfile)]
+    base = list(catalog)
+    number = 0
+    while len(catalog) < size:
+        name, measurement_unit = base[number % len(base)]
+        catalog.append((f'{name} {number // len(base) + 1}', measurement_unit))
+        number += 1
+    return catalog
+
+
+def measure(function, repeat):
+    """Среднее время вызова в микросекундах."""
+    start = default_timer()
+    for _ in range(repeat):
+        function()
+    return (default_timer() - start) / repeat * 1_000_000
+
+
+@contextmanager
+def benchmark_catalog(catalog):
+    """
+    Загружает каталог ингредиентов на время замеров и откатывает
+    транзакцию после них. Запускается только на базе с пустым
+    справочником ингредиентов: рабочие данные не удаляются и не
+    блокируются.
+    """
+    if Ingredient.objects.exists():
+        raise CommandError(
+            'Справочник ингредиентов не пуст. Замеры запускаются '
+            'только на отдельной пустой базе.'
+        )
+    try:
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in catalog
+                ),
+                batch_size=5000,
+            )
+            yield
+            raise Rollback
+    except Rollback:
+        pass
@@ -0,0 +1,129 @@
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+from django.db.models import F
+from django.utils import timezone
+
+from .constants import INGREDIENTS_CATALOG
+from .models import CatalogVersion, Ingredient
+
+
+def get_catalog_version(name):
+    """Текущая версия справочника."""
+    version = (
+        CatalogVersion.objects.filter(name=name)
+        .values_list('version', flat=True)
+        .first()
+    )
+    return version or 0
+
+
+def get_catalog_versions(*names):
+    """
+    Версии и даты изменения нескольких справочников одним запросом:
+    словарь {name: (version, updated_at)}. Для справочников, которые
+    еще не менялись, - (0, None).
+    """
+    versions = dict.fromkeys(names, (0, None))
+    versions.update(
+        (name, (version, updated_at))
+        for name, version, updated_at in CatalogVersion.objects.filter(
+            name__in=names
+        ).values_list('name', 'version', 'updated_at')
+    )
+    return versions
+
+
+def bump_catalog_version(name):
+    """Отмечает изменение справочника."""
+    updated = CatalogVersion.objects.filter(name=name).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(
+            name=name, defaults={'version': 1}
+        )
+
+
+def set_catalog_version(name, version):
+    """Устанавливает версию справочника."""
+    CatalogVersion.objects.update_or_create(
+        name=name, defaults={'version': version}
+    )
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для поиска по названию.
+
+    Названия в нижнем регистре хранятся отсортированными: совпадения
+    по началу названия находятся бинарным поиском, а совпадения
+    по подстроке - поиском по склеенной строке всех названий.
+    """
+
+    separator = '\n'
+
+    def __init__(self, rows=()):
+        rows = sorted(rows, key=lambda row: (row[1].lower(), row[0]))
+        self.rows = rows
+        self.keys = [name.lower() for _, name, _ in rows]
+        self.offsets = []
+        offset = 0
+        for key in self.keys:
+            self.offsets.append(offset)
+            offset += len(key) + len(self.separator)
+        self.text = self.separator.join(self.keys)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, value):
+        """
+        Возвращает строки (id, name, measurement_unit): сначала
+        названия, начинающиеся с value, затем содержащие value.
+        """
+        value = value.lower()
+        if not value:
+            return list(self.rows)
+        if self.separator in value:
+            return []
+        start = bisect_left(self.keys, value)
+        end = bisect_left(self.keys, value + '\uffff', lo=start)
+        result = self.rows[start:end]
+        text = self.text
+        position = text.find(value)
+        while position != -1:
+            index = bisect_right(self.offsets, position) - 1
+            if not start <= index < end:
+                result.append(self.rows[index])
+            next_offset = (
+                self.offsets[index + 1] if index + 1 < len(self.offsets)
+                else len(text)
+            )
+            position = text.find(value, next_offset)
+        return result
+
+
+class IngredientIndexCache:
+    """Индекс ингредиентов, перестраиваемый при смене версии справочника."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.index = IngredientIndex()
+
+    def get(self):
+        version = get_catalog_version(INGREDIENTS_CATALOG)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.index = IngredientIndex(
+                        Ingredient.objects.values_list(
+                            'id', 'name', 'measurement_unit'
+                        ).order_by()
+                    )
+                    self.version = version
+        return self.index
+
+
+ingredient_index = IngredientIndexCache()
@@ -5,3 +5,22 @@ TAG_SLUG_LEN = 150
 RECIPE_NAME_LEN = 200
 MIN_COOKING_TIME = 1
 MIN_AMOUNT = 1
+RECIPE_BATCH_SIZE = 100
+RECIPE_COUNTER_FIELDS = ('favorites_count', 'cart_count')
+CATALOG_NAME_LEN = 50
+INGREDIENTS_CATALOG = 'ingredients'
+TAGS_CATALOG = 'tags'
+RECIPE_INGREDIENTS_CATALOG = 'recipe_ingredients'
+SEARCH_CONFIG = 'russian'
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_CART_WEIGHT = 0.5
+FEED_CELEBRITY_SUBSCRIBERS = 10000
+FEED_BACKFILL_SIZE = 100
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_TAG_WEIGHT = 0.5
+PANTRY_MAX_INGREDIENTS = 100
+PANTRY_CHANGES_KEPT = 10000
+PANTRY_MAX_CHANGED = 1000
+COOKING_TIME_BUCKETS = ((None, 15), (16, 30), (31, 60), (61, None))
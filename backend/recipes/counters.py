@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.db.models import (
+    Count, F, IntegerField, OuterRef, Q, Subquery
+)
+from django.db.models.functions import Coalesce
+
+from users.models import Subscribe
+
+from .models import Favorite, Recipe, ShoppingCart
+
+
+User = get_user_model()
+
+USER_RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'cart_count',
+}
+
+
+def change_counter(queryset, field, delta):
+    """
+    Атомарно изменяет счетчик у объектов queryset.
+    При уменьшении счетчик не опускается ниже нуля.
+    """
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_recipe_counter(recipe_ids, field, delta):
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        change_counter(Recipe.objects.filter(id__in=recipe_ids), field, delta)
+
+
+def change_user_counter(user_ids, field, delta):
+    user_ids = list(user_ids)
+    if user_ids:
+        change_counter(User.objects.filter(id__in=user_ids), field, delta)
+
+
+def count_subquery(model, field):
+    """Количество строк model, ссылающихся на объект через field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recipe_counters():
+    return {
+        'favorites_count': count_subquery(Favorite, 'recipe'),
+        'cart_count': count_subquery(ShoppingCart, 'recipe'),
+    }
+
+
+def user_counters():
+    return {
+        'recipes_count': count_subquery(Recipe, 'author'),
+        'subscribers_count': count_subquery(Subscribe, 'author'),
+    }
+
+
+def reconcile(queryset, counters):
+    """
+    Пересчитывает счетчики объектов queryset по связанным таблицам
+    одним запросом. Возвращает количество исправленных объектов.
+    """
+    drifted = Q()
+    for field, expression in counters.items():
+        drifted |= ~Q(**{field: expression})
+    return queryset.filter(drifted).update(**counters)
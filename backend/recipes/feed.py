@@ -0,0 +1,146 @@
+from django.db import connection
+from django.db.models import BigIntegerField, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Subscribe, User
+
+from .constants import FEED_BACKFILL_SIZE, FEED_CELEBRITY_SUBSCRIBERS
+from .models import FeedEntry, Recipe
+from .tasks import run_after_commit
+
+
+FEED_TABLE = FeedEntry._meta.db_table
+SUBSCRIBE_TABLE = Subscribe._meta.db_table
+
+
+def is_celebrity(subscribers_count):
+    """Рецепты авторов с большим числом подписчиков читаются при запросе."""
+    return subscribers_count >= FEED_CELEBRITY_SUBSCRIBERS
+
+
+def fan_out(recipe_id, author_id):
+    """Добавляет рецепт в ленты всех подписчиков автора."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FEED_TABLE} (user_id, author_id, recipe_id) '
+            f'SELECT user_id, author_id, %s FROM {SUBSCRIBE_TABLE} '
+            'WHERE author_id = %s '
+            'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+            [recipe_id, author_id]
+        )
+
+
+def publish(recipe):
+    """
+    Рецепт опубликован: после фиксации транзакции он рассылается
+    в ленты подписчиков в фоновом потоке. Рецепты популярных
+    авторов не рассылаются.
+    """
+    if is_celebrity(recipe.author.subscribers_count):
+        return
+    run_after_commit(fan_out, recipe.id, recipe.author_id)
+
+
+def backfill(user_id, author_id):
+    """
+    Добавляет в ленту подписчика не больше FEED_BACKFILL_SIZE
+    последних рецептов автора, если автор не из популярных.
+    Если у автора есть рецепты старше добавленных, самый старый
+    добавленный становится границей ленты: рецепты до него
+    читаются при запросе ленты.
+    """
+    recipe_ids = list(
+        Recipe.objects.filter(
+            author_id=author_id,
+            author__subscribers_count__lt=FEED_CELEBRITY_SUBSCRIBERS
+        )
+        .order_by('-id')
+        .values_list('id', flat=True)[:FEED_BACKFILL_SIZE]
+    )
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, author_id=author_id, recipe_id=pk)
+            for pk in recipe_ids
+        ],
+        ignore_conflicts=True
+    )
+    if len(recipe_ids) == FEED_BACKFILL_SIZE:
+        Subscribe.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).update(feed_before=recipe_ids[-1])
+
+
+def subscriber_removed(author_id):
+    """
+    Вызывается после уменьшения счетчика подписчиков. Если автор
+    только что перестал быть популярным, его рецепты, опубликованные
+    без рассылки, читаются при запросе ленты: границей ленты всех
+    подписчиков становится id после последнего рецепта автора.
+    Новые рецепты снова рассылаются.
+    """
+    if not User.objects.filter(
+        id=author_id, subscribers_count=FEED_CELEBRITY_SUBSCRIBERS - 1
+    ).exists():
+        return
+    latest_id = (
+        Recipe.objects.filter(author_id=author_id)
+        .order_by('-id').values_list('id', flat=True).first()
+    )
+    if latest_id is not None:
+        Subscribe.objects.filter(author_id=author_id).update(
+            feed_before=latest_id + 1
+        )
+
+
+def trim(user_id, author_id):
+    """Удаляет из ленты подписчика рецепты автора."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def feed_recipe_ids(user_id, before=None, limit=FEED_BACKFILL_SIZE):
+    """
+    id рецептов ленты по убыванию, меньше before. Записи ленты читаются
+    одним проходом по индексу. Отдельным запросом читаются рецепты
+    популярных авторов, рецепты старше границы ленты подписки и рецепты
+    подписок новее последней записи ленты, результаты сливаются.
+
+    Рассылка идет в фоновом потоке процесса и не переживает его
+    перезапуск: рецепт, опубликованный перед перезапуском, может
+    не попасть в ленты. Пока он новее последней записи ленты
+    подписчика, он читается при запросе, но если после него в ленту
+    разослан более новый рецепт, пропущенный рецепт из ленты выпадает.
+    """
+    entries = FeedEntry.objects.filter(user_id=user_id)
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+    recipe_ids = set(
+        entries.order_by('-recipe_id')
+        .values_list('recipe_id', flat=True)[:limit]
+    )
+    subscriptions = Subscribe.objects.filter(
+        Q(author__subscribers_count__gte=FEED_CELEBRITY_SUBSCRIBERS)
+        | Q(feed_before__isnull=False),
+        user_id=user_id
+    ).values_list('author_id', 'author__subscribers_count', 'feed_before')
+    newest_entry = Subquery(
+        FeedEntry.objects.filter(user_id=user_id)
+        .order_by('-recipe_id').values('recipe_id')[:1]
+    )
+    condition = Q(
+        author_id__in=Subscribe.objects.filter(
+            user_id=user_id
+        ).values('author_id'),
+        id__gt=Coalesce(newest_entry, 0, output_field=BigIntegerField())
+    )
+    for author_id, subscribers_count, feed_before in subscriptions:
+        if is_celebrity(subscribers_count):
+            condition |= Q(author_id=author_id)
+        else:
+            condition |= Q(author_id=author_id, id__lt=feed_before)
+    recipes = Recipe.objects.filter(condition)
+    if before is not None:
+        recipes = recipes.filter(id__lt=before)
+    recipe_ids.update(
+        recipes.order_by('-id').values_list('id', flat=True)[:limit]
+    )
+    return sorted(recipe_ids, reverse=True)[:limit]
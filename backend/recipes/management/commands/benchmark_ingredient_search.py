@@ -0,0 +1,65 @@
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand
+
+from recipes.benchmarks import benchmark_catalog, load_catalog, measure
+from recipes.catalog import IngredientIndex
+from recipes.models import Ingredient
+
+
+QUERIES = ('а', 'мол', 'сыр', 'кур', 'томат', 'перец черный', 'яйц')
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает поиск ингредиентов по индексу в памяти с запросом
+    name__icontains. Данные загружаются в транзакции и откатываются,
+    справочник ингредиентов в базе должен быть пуст.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            action='append',
+            dest='sizes',
+            help='Размер каталога (можно указать несколько раз). '
+                 'По умолчанию: CSV и 1 000 000 строк.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Количество повторов каждого запроса',
+        )
+
+    def handle(self, *args, **options):
+        for size in options['sizes'] or [0, 1_000_000]:
+            catalog = load_catalog(size)
+            with benchmark_catalog(catalog):
+                self.benchmark(catalog, options['repeat'])
+
+    def benchmark(self, catalog, repeat):
+        start = default_timer()
+        index = IngredientIndex(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        )
+        build_time = default_timer() - start
+        self.stdout.write(
+            f'Каталог: {len(catalog)} строк, '
+            f'построение индекса: {build_time:.3f} с'
+        )
+        for query in QUERIES:
+            found = len(index.search(query))
+            index_time = measure(lambda: index.search(query), repeat)
+            orm_time = measure(
+                lambda: list(
+                    Ingredient.objects.filter(name__icontains=query)
+                    .values_list('id', 'name', 'measurement_unit')
+                ),
+                max(1, repeat // 10),
+            )
+            self.stdout.write(
+                f'  {query!r}: найдено {found}, '
+                f'индекс {index_time:.0f} мкс, ORM {orm_time:.0f} мкс'
+            )
@@ -0,0 +1,82 @@
+from timeit import default_timer
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from recipes.pantry import PantryIndex
+
+
+def synthetic_rows(recipes, ingredients, per_recipe, seed):
+    """
+    Состав синтетических рецептов: популярность ингредиентов
+    распределена по закону Ципфа, как у соли и сахара в реальных данных.
+    Повторы ингредиента в рецепте отбрасываются.
+    """
+    generator = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, ingredients + 1)
+    weights /= weights.sum()
+    sizes = generator.integers(
+        max(1, per_recipe // 2), per_recipe * 3 // 2 + 1, size=recipes
+    )
+    rows = np.column_stack([
+        np.repeat(np.arange(1, recipes + 1), sizes),
+        generator.choice(ingredients, size=sizes.sum(), p=weights) + 1,
+    ])
+    return np.unique(rows, axis=0).tolist()
+
+
+class Command(BaseCommand):
+    """
+    Замеряет подбор рецептов по имеющимся ингредиентам
+    на синтетическом индексе в памяти.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=300_000)
+        parser.add_argument('--ingredients', type=int, default=2_000)
+        parser.add_argument(
+            '--per-recipe',
+            type=int,
+            default=8,
+            help='Среднее число ингредиентов в рецепте',
+        )
+        parser.add_argument(
+            '--pantry-size',
+            type=int,
+            default=15,
+            help='Число ингредиентов в запросе',
+        )
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rows = synthetic_rows(
+            options['recipes'],
+            options['ingredients'],
+            options['per_recipe'],
+            options['seed'],
+        )
+        start = default_timer()
+        index = PantryIndex(rows)
+        self.stdout.write(
+            f'Индекс: {len(index)} рецептов, {len(index.postings)} связей, '
+            f'построение {default_timer() - start:.2f} с'
+        )
+        generator = np.random.default_rng(options['seed'])
+        timings = []
+        for _ in range(options['queries']):
+            pantry = generator.choice(
+                options['ingredients'],
+                size=options['pantry_size'],
+                replace=False
+            ) + 1
+            start = default_timer()
+            index.search(pantry.tolist(), options['limit'])
+            timings.append((default_timer() - start) * 1000)
+        p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+        self.stdout.write(
+            f'Запросов: {len(timings)}, p50 {p50:.2f} мс, '
+            f'p95 {p95:.2f} мс, p99 {p99:.2f} мс, '
+            f'максимум {max(timings):.2f} мс'
+        )
@@ -0,0 +1,61 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.similarity import RecipeVectors, save_neighbours
+
+vectors = None
+
+
+def init_worker(shared_vectors):
+    global vectors
+    vectors = shared_vectors
+
+
+def compute_shard(bounds):
+    start, stop = bounds
+    return vectors.ids[start:stop].tolist(), vectors.neighbours(start, stop)
+
+
+class Command(BaseCommand):
+    """Пересчитывает таблицу похожих рецептов."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов для расчета',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=256,
+            help='Количество рецептов в одной части расчета',
+        )
+
+    def handle(self, *args, **options):
+        """Расчет близости частями в пуле процессов."""
+        started = time.monotonic()
+        recipe_vectors = RecipeVectors.load()
+        chunk_size = options['chunk_size']
+        shards = [
+            (start, min(start + chunk_size, len(recipe_vectors)))
+            for start in range(0, len(recipe_vectors), chunk_size)
+        ]
+        # Дочерние процессы не должны наследовать соединения с БД.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            initializer=init_worker,
+            initargs=(recipe_vectors,),
+        ) as executor:
+            for recipe_ids, rows in executor.map(compute_shard, shards):
+                save_neighbours(recipe_ids, rows)
+        self.stdout.write(
+            f'- Похожие рецепты пересчитаны: {len(recipe_vectors)} рецептов '
+            f'за {time.monotonic() - started:.2f} с.'
+        )
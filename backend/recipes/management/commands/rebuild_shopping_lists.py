@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.shopping_list import rebuild
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Пересчитывает списки покупок по корзинам пользователей."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='id пользователя (можно указать несколько раз). '
+                 'По умолчанию пересчитываются все списки.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Количество пользователей в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        """Пересчет списков покупок."""
+        user_ids = options['users'] or list(
+            User.objects.order_by('id').values_list('id', flat=True)
+        )
+        chunk_size = options['chunk_size']
+        for start in range(0, len(user_ids), chunk_size):
+            with transaction.atomic():
+                rebuild(user_ids[start:start + chunk_size])
+        self.stdout.write(
+            f'- Списки покупок пересчитаны: {len(user_ids)} пользователей.'
+        )
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from recipes.counters import reconcile, recipe_counters, user_counters
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Исправляет расхождения счетчиков рецептов и пользователей."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество объектов в одном запросе',
+        )
+
+    def reconcile_model(self, model, counters, chunk_size):
+        last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        fixed = 0
+        for start in range(1, last_id + 1, chunk_size):
+            fixed += reconcile(
+                model.objects.filter(id__gte=start, id__lt=start + chunk_size),
+                counters
+            )
+        return fixed
+
+    def handle(self, *args, **options):
+        """Пересчет счетчиков по диапазонам id."""
+        chunk_size = options['chunk_size']
+        recipes = self.reconcile_model(
+            Recipe, recipe_counters(), chunk_size
+        )
+        users = self.reconcile_model(User, user_counters(), chunk_size)
+        self.stdout.write(
+            f'- Счетчики исправлены: рецептов {recipes}, '
+            f'пользователей {users}.'
+        )
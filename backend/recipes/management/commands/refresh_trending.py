@@ -0,0 +1,64 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from recipes.ranking import refresh_trending
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Пересчитывает рейтинг рецептов для сортировки по трендам."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать все рецепты с активностью за окно',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одной транзакции',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Повторять пересчет каждые N секунд. '
+                 'По умолчанию пересчет выполняется один раз.',
+        )
+
+    def refresh(self, full, chunk_size):
+        started = time.monotonic()
+        count = refresh_trending(full=full, chunk_size=chunk_size)
+        self.stdout.write(
+            f'- Рейтинг трендов пересчитан: {count} рецептов '
+            f'за {time.monotonic() - started:.2f} с.'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Пересчет рейтинга, однократный или по расписанию. При работе
+        по расписанию ошибка пересчета записывается в лог, а пересчет
+        повторяется на следующей итерации.
+        """
+        full = options['full']
+        interval = options['interval']
+        while True:
+            try:
+                self.refresh(full, options['chunk_size'])
+            except Exception:
+                if interval <= 0:
+                    raise
+                logger.exception('Пересчет рейтинга трендов не удался')
+            else:
+                full = False
+            if interval <= 0:
+                return
+            time.sleep(interval)
+            close_old_connections()
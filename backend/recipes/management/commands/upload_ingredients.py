@@ -2,6 +2,8 @@ import csv
 
 from django.core.management.base import BaseCommand
 
+from recipes.catalog import bump_catalog_version
+from recipes.constants import INGREDIENTS_CATALOG
 from recipes.models import Ingredient
 
 
@@ -46,4 +48,5 @@ class Command(BaseCommand):
                 records.append(record)
 
         Ingredient.objects.bulk_create(records)
+        bump_catalog_version(INGREDIENTS_CATALOG)
         self.stdout.write('- Ингредиенты добавлены.')
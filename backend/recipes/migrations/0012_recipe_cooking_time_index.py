@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:16
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_tags_tag_recipe_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='cooking_time',
+            field=models.PositiveSmallIntegerField(db_index=True, help_text='Обязательное поле. Минимум 1 минут.', validators=[django.core.validators.MinValueValidator(limit_value=1, message='Минимальное время приготовления — 1 минут.')], verbose_name='Время приготовления'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:45
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+
+def move_refresh_time(apps, schema_editor):
+    """
+    Переносит время последнего пересчета трендов, которое хранилось
+    как unix-время в версии справочника trending.
+    """
+    CatalogVersion = apps.get_model('recipes', 'CatalogVersion')
+    RankingRefresh = apps.get_model('recipes', 'RankingRefresh')
+    catalog = CatalogVersion.objects.filter(name='trending').first()
+    if catalog is None:
+        return
+    if catalog.version:
+        RankingRefresh.objects.create(
+            refreshed_at=datetime.fromtimestamp(
+                catalog.version, timezone.utc
+            )
+        )
+    catalog.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipeingredientschange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Время пересчета')),
+            ],
+            options={
+                'verbose_name': 'Пересчет рейтинга',
+                'verbose_name_plural': 'Пересчеты рейтинга',
+            },
+        ),
+        migrations.RunPython(move_refresh_time, migrations.RunPython.noop),
+    ]
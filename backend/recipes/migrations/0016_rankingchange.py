@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_rankingrefresh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.PositiveBigIntegerField(unique=True, verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Изменение рейтинга',
+                'verbose_name_plural': 'Изменения рейтинга',
+            },
+        ),
+    ]
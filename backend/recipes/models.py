@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -9,7 +10,9 @@ from .constants import (
     TAG_SLUG_LEN,
     RECIPE_NAME_LEN,
     MIN_COOKING_TIME,
-    MIN_AMOUNT
+    MIN_AMOUNT,
+    CATALOG_NAME_LEN,
+    RECIPE_COUNTER_FIELDS
 )
 
 from .validators import HexColorValidator
@@ -111,6 +114,7 @@ class Recipe(models.Model):
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления',
         help_text=f'Обязательное поле. Минимум {MIN_COOKING_TIME} минут.',
+        db_index=True,
         validators=[
             MinValueValidator(
                 limit_value=MIN_COOKING_TIME,
@@ -119,15 +123,61 @@ class Recipe(models.Model):
             )
         ]
     )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'Добавлений в корзину',
+        default=0,
+        editable=False
+    )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_latest_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Счетчики меняются атомарными UPDATE с F(), поэтому полное
+        сохранение существующего рецепта их не перезаписывает:
+        в объекте могут быть устаревшие значения.
+        """
+        if (
+            kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in RECIPE_COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientInRecipe(models.Model):
     """Модель ингридиента в рецепте."""
@@ -181,6 +231,11 @@ class UserRecipe(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True
+    )
 
     class Meta:
         abstract = True
@@ -204,3 +259,224 @@ class ShoppingCart(UserRecipe):
         default_related_name = 'cart'
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель списка покупок: суммарное количество ингредиента
+    по всем рецептам в корзине пользователя.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField('Количество')
+
+    class Meta:
+        ordering = ['user', 'ingredient__name']
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} — {self.amount}'
+
+
+class CatalogVersion(models.Model):
+    """
+    Версия справочника. Увеличивается при каждом изменении справочника,
+    по ней процессы узнают, что их копии в памяти устарели.
+    """
+
+    name = models.CharField(
+        'Справочник',
+        max_length=CATALOG_NAME_LEN,
+        unique=True
+    )
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class RecipeIngredientsChange(models.Model):
+    """
+    Журнал изменений состава рецептов: какие рецепты изменились
+    в каждой версии справочника состава. По нему процессы
+    обновляют индекс в памяти только для измененных рецептов.
+    """
+
+    version = models.PositiveBigIntegerField('Версия', db_index=True)
+    recipe_id = models.PositiveBigIntegerField('Рецепт')
+
+    class Meta:
+        verbose_name = 'Изменение состава рецепта'
+        verbose_name_plural = 'Изменения состава рецептов'
+
+    def __str__(self):
+        return f'{self.version}: {self.recipe_id}'
+
+
+class RecipeRanking(models.Model):
+    """
+    Предрассчитанный рейтинг рецепта для сортировки по трендам.
+    Строка есть только у рецептов с активностью за последнее окно.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт'
+    )
+    trending_score = models.FloatField('Рейтинг в трендах')
+
+    class Meta:
+        ordering = ['-trending_score']
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=['-trending_score', '-recipe'],
+                name='recipe_trending_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.trending_score}'
+
+
+class RankingRefresh(models.Model):
+    """
+    Время последнего пересчета рейтинга трендов. Таблица из одной
+    строки: по этому времени следующий пересчет находит рецепты
+    с изменившейся активностью.
+    """
+
+    refreshed_at = models.DateTimeField('Время пересчета')
+
+    class Meta:
+        verbose_name = 'Пересчет рейтинга'
+        verbose_name_plural = 'Пересчеты рейтинга'
+
+    def __str__(self):
+        return f'{self.refreshed_at:%Y-%m-%d %H:%M:%S}'
+
+
+class RankingChange(models.Model):
+    """
+    Рецепт, у которого удалено событие рейтинга (избранное или
+    корзина). Удаленные события не находятся по времени создания,
+    поэтому следующий пересчет берет такие рецепты отсюда.
+    """
+
+    recipe_id = models.PositiveBigIntegerField('Рецепт', unique=True)
+
+    class Meta:
+        verbose_name = 'Изменение рейтинга'
+        verbose_name_plural = 'Изменения рейтинга'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class FeedEntry(models.Model):
+    """
+    Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь. Ленту читают по индексу (user, recipe) в порядке
+    убывания id рецепта.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        ordering = ['user', '-recipe']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe_id}'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Предрассчитанный похожий рецепт: косинусная близость
+    векторов ингредиентов и тегов двух рецептов.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Близость')
+
+    class Meta:
+        ordering = ['recipe', '-score']
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.similar_id}: {self.score:.3f}'
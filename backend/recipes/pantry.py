@@ -0,0 +1,257 @@
+from copy import copy
+from heapq import nsmallest
+from itertools import chain
+from threading import Lock, local
+
+import numpy as np
+from django.db import transaction
+
+from .catalog import get_catalog_version
+from .constants import (
+    PANTRY_CHANGES_KEPT, PANTRY_MAX_CHANGED, RECIPE_INGREDIENTS_CATALOG
+)
+from .models import CatalogVersion, IngredientInRecipe, RecipeIngredientsChange
+
+
+class PantryIndex:
+    """
+    Инвертированный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится массив номеров рецептов,
+    в которых он есть. Число имеющихся ингредиентов каждого рецепта
+    считается одним np.bincount по массивам выбранных ингредиентов.
+    Рецепты, измененные после построения массивов, исключаются
+    из них и хранятся отдельно в changed.
+    """
+
+    def __init__(self, rows=()):
+        rows = np.fromiter(
+            chain.from_iterable(rows), dtype=np.int64
+        ).reshape(-1, 2)
+        self.recipe_ids, recipe_rows = np.unique(
+            rows[:, 0], return_inverse=True
+        )
+        self.sizes = np.bincount(
+            recipe_rows, minlength=len(self.recipe_ids)
+        ).astype(np.int32)
+        order = np.argsort(rows[:, 1], kind='stable')
+        ingredient_ids, starts = np.unique(
+            rows[order, 1], return_index=True
+        )
+        self.postings = recipe_rows[order].astype(np.int32)
+        self.bounds = {
+            int(ingredient_id): (start, stop)
+            for ingredient_id, start, stop in zip(
+                ingredient_ids, starts, [*starts[1:], len(order)]
+            )
+        }
+        self.stale = np.empty(0, dtype=np.intp)
+        self.changed = {}
+
+    def __len__(self):
+        return (
+            len(self.recipe_ids) - len(self.stale)
+            + sum(1 for ingredients in self.changed.values() if ingredients)
+        )
+
+    def update(self, recipes):
+        """
+        Индекс с новым составом рецептов recipes: словарь
+        {id рецепта: id ингредиентов}, пустой состав у удаленных.
+        Массивы общие с текущим индексом, поэтому обновление
+        не мешает потокам, которые ищут по текущему.
+        """
+        index = copy(self)
+        index.changed = {
+            **self.changed,
+            **{
+                recipe_id: frozenset(ingredient_ids)
+                for recipe_id, ingredient_ids in recipes.items()
+            }
+        }
+        recipe_ids = np.fromiter(recipes, dtype=np.int64, count=len(recipes))
+        rows = np.searchsorted(self.recipe_ids, recipe_ids)
+        found = rows < len(self.recipe_ids)
+        found[found] = self.recipe_ids[rows[found]] == recipe_ids[found]
+        index.stale = np.union1d(self.stale, rows[found])
+        return index
+
+    def search(self, ingredient_ids, limit, max_missing=None):
+        """
+        Рецепты, в которых есть хотя бы один из ingredient_ids:
+        список (id рецепта, число недостающих ингредиентов). Сначала
+        рецепты с меньшим числом недостающих, затем с большим числом
+        имеющихся, затем более новые.
+        """
+        if limit <= 0:
+            return []
+        ingredient_ids = set(ingredient_ids)
+        keys = self.search_postings(ingredient_ids, limit, max_missing)
+        for recipe_id, ingredients in self.changed.items():
+            matched = len(ingredients & ingredient_ids)
+            missing = len(ingredients) - matched
+            if matched and (max_missing is None or missing <= max_missing):
+                keys.append((missing, -matched, -recipe_id))
+        return [
+            (-negative_id, missing)
+            for missing, _, negative_id in nsmallest(limit, keys)
+        ]
+
+    def search_postings(self, ingredient_ids, limit, max_missing):
+        """
+        Поиск по массивам: ключи сортировки (недостает, -имеется,
+        -id рецепта) не более limit лучших рецептов.
+        """
+        postings = [
+            self.postings[slice(*self.bounds[ingredient_id])]
+            for ingredient_id in ingredient_ids
+            if ingredient_id in self.bounds
+        ]
+        if not postings:
+            return []
+        matched = np.bincount(
+            np.concatenate(postings), minlength=len(self.recipe_ids)
+        )
+        matched[self.stale] = 0
+        candidates = np.flatnonzero(matched)
+        missing = self.sizes[candidates] - matched[candidates]
+        if max_missing is not None:
+            keep = missing <= max_missing
+            candidates, missing = candidates[keep], missing[keep]
+        size = len(self.recipe_ids)
+        largest = int(self.sizes.max()) + 1
+        keys = (
+            (missing.astype(np.int64) * largest - matched[candidates])
+            * size + (size - 1 - candidates)
+        )
+        if len(keys) > limit:
+            top = np.argpartition(keys, limit - 1)[:limit]
+            candidates, missing, keys = (
+                candidates[top], missing[top], keys[top]
+            )
+        return [
+            (int(count), -int(matched[row]), -int(self.recipe_ids[row]))
+            for row, count in zip(candidates, missing)
+        ]
+
+
+def record_changes(recipe_ids):
+    """
+    Увеличивает версию состава рецептов и записывает в журнал
+    рецепты, изменившиеся в этой версии. Строка версии заблокирована
+    до конца транзакции, поэтому версии фиксируются по порядку.
+    """
+    with transaction.atomic():
+        catalog, _ = CatalogVersion.objects.select_for_update().get_or_create(
+            name=RECIPE_INGREDIENTS_CATALOG
+        )
+        catalog.version += 1
+        catalog.save(update_fields=['version', 'updated_at'])
+        RecipeIngredientsChange.objects.bulk_create(
+            RecipeIngredientsChange(
+                version=catalog.version, recipe_id=recipe_id
+            )
+            for recipe_id in recipe_ids
+        )
+        RecipeIngredientsChange.objects.filter(
+            version__lte=catalog.version - PANTRY_CHANGES_KEPT
+        ).delete()
+
+
+class PendingChanges(local):
+    """Рецепты, изменившиеся в текущей транзакции потока."""
+
+    def __init__(self):
+        self.recipe_ids = set()
+
+
+pending_changes = PendingChanges()
+
+
+def recipes_changed(recipe_ids):
+    """
+    Отмечает изменение состава рецептов после фиксации транзакции,
+    чтобы запись рецепта не ждала блокировку строки версии.
+    Все рецепты транзакции записываются одной версией.
+    """
+    recipe_ids = set(recipe_ids)
+    if recipe_ids:
+        pending_changes.recipe_ids |= recipe_ids
+        transaction.on_commit(flush_changes)
+
+
+def flush_changes():
+    recipe_ids = pending_changes.recipe_ids
+    pending_changes.recipe_ids = set()
+    if recipe_ids:
+        record_changes(recipe_ids)
+
+
+class PantryIndexCache:
+    """
+    Индекс, синхронизируемый по журналу изменений состава рецептов:
+    при смене версии перечитываются только изменившиеся рецепты.
+    Индекс перестраивается целиком при первом обращении, если журнал
+    уже не содержит нужных версий или изменившихся рецептов
+    накопилось больше PANTRY_MAX_CHANGED. Пока один поток обновляет
+    индекс, остальные отвечают по предыдущей версии.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.index = None
+
+    def build(self, version):
+        self.index = PantryIndex(
+            IngredientInRecipe.objects.values_list(
+                'recipe_id', 'ingredient_id'
+            ).order_by().iterator()
+        )
+        self.version = version
+
+    def get(self):
+        version = get_catalog_version(RECIPE_INGREDIENTS_CATALOG)
+        if version == self.version:
+            return self.index
+        if self.lock.acquire(blocking=self.index is None):
+            try:
+                if version != self.version and not self.apply(version):
+                    self.build(version)
+            finally:
+                self.lock.release()
+        return self.index
+
+    def apply(self, version):
+        """
+        Применяет изменения версий после текущей до version.
+        Возвращает False, если нужно перестроить индекс целиком.
+        """
+        if self.index is None or not 0 < version - self.version < (
+            PANTRY_CHANGES_KEPT
+        ):
+            return False
+        changes = RecipeIngredientsChange.objects.filter(
+            version__gt=self.version, version__lte=version
+        ).values_list('version', 'recipe_id')
+        versions = set()
+        recipes = {}
+        for changed_version, recipe_id in changes:
+            versions.add(changed_version)
+            recipes[recipe_id] = []
+        if len(versions) != version - self.version:
+            return False
+        if len(self.index.changed.keys() | recipes.keys()) > (
+            PANTRY_MAX_CHANGED
+        ):
+            return False
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipes
+        ).values_list('recipe_id', 'ingredient_id').order_by():
+            recipes[recipe_id].append(ingredient_id)
+        self.index = self.index.update(recipes)
+        self.version = version
+        return True
+
+
+pantry_index = PantryIndexCache()
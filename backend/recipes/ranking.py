@@ -0,0 +1,138 @@
+import math
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .constants import (
+    TRENDING_CART_WEIGHT,
+    TRENDING_FAVORITE_WEIGHT,
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_WINDOW_DAYS,
+)
+from .models import (
+    Favorite, RankingChange, RankingRefresh, RecipeRanking, ShoppingCart
+)
+
+
+TRENDING_WINDOW = timedelta(days=TRENDING_WINDOW_DAYS)
+TRENDING_DECAY = TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+TRENDING_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+# Запас на транзакции, начатые до прошлого пересчета
+# и зафиксированные после него.
+TRENDING_GRACE = timedelta(minutes=5)
+TRENDING_EVENTS = (
+    (Favorite, TRENDING_FAVORITE_WEIGHT),
+    (ShoppingCart, TRENDING_CART_WEIGHT),
+)
+
+
+def trending_score(events):
+    """
+    Рейтинг по событиям (время, вес): логарифм суммы весов, затухающих
+    с заданным периодом полураспада. Время отсчитывается от постоянной
+    точки, поэтому рейтинги, посчитанные в разное время, сравнимы между
+    собой, и течение времени само по себе пересчета не требует.
+    """
+    exponents = [
+        math.log(weight)
+        + (created - TRENDING_EPOCH).total_seconds() / TRENDING_DECAY
+        for created, weight in events
+    ]
+    top = max(exponents)
+    return top + math.log(sum(math.exp(value - top) for value in exponents))
+
+
+def window_events(recipe_ids, start):
+    """События рецептов за окно: {id рецепта: [(время, вес), ...]}."""
+    events = {}
+    for model, weight in TRENDING_EVENTS:
+        rows = (
+            model.objects
+            .filter(recipe_id__in=recipe_ids, created__gte=start)
+            .values_list('recipe_id', 'created')
+            .order_by()
+        )
+        for recipe_id, created in rows:
+            events.setdefault(recipe_id, []).append((created, weight))
+    return events
+
+
+def mark_ranking_changed(recipe_ids):
+    """Отмечает рецепты, у которых удалены события рейтинга."""
+    RankingChange.objects.bulk_create(
+        [RankingChange(recipe_id=recipe_id) for recipe_id in recipe_ids],
+        ignore_conflicts=True
+    )
+
+
+def event_recipes(condition):
+    recipe_ids = set()
+    for model, _ in TRENDING_EVENTS:
+        recipe_ids.update(
+            model.objects.filter(condition)
+            .values_list('recipe_id', flat=True)
+            .order_by()
+            .distinct()
+        )
+    return recipe_ids
+
+
+def changed_recipes(now, full=False):
+    """
+    Рецепты, рейтинг которых нужно пересчитать: с новыми событиями,
+    с событиями, вышедшими из окна после прошлого пересчета,
+    и с удаленными событиями.
+    """
+    start = now - TRENDING_WINDOW
+    last_refresh = RankingRefresh.objects.values_list(
+        'refreshed_at', flat=True
+    ).first()
+    recipe_ids = set(
+        RankingChange.objects.values_list('recipe_id', flat=True)
+    )
+    if full or last_refresh is None:
+        recipe_ids.update(event_recipes(Q(created__gte=start)))
+        recipe_ids.update(
+            RecipeRanking.objects.values_list('recipe_id', flat=True)
+        )
+        return recipe_ids
+    since = last_refresh - TRENDING_GRACE
+    recipe_ids.update(event_recipes(
+        Q(created__gte=since)
+        | Q(created__gte=since - TRENDING_WINDOW, created__lt=start)
+    ))
+    return recipe_ids
+
+
+def refresh_trending(full=False, chunk_size=1000):
+    """
+    Пересчитывает рейтинг трендов. По умолчанию пересчитываются
+    только рецепты, активность которых изменилась с прошлого запуска,
+    full=True пересчитывает все рецепты с активностью за окно.
+    Возвращает количество пересчитанных рецептов.
+    """
+    now = timezone.now()
+    start = now - TRENDING_WINDOW
+    recipe_ids = sorted(changed_recipes(now, full))
+    for offset in range(0, len(recipe_ids), chunk_size):
+        chunk = recipe_ids[offset:offset + chunk_size]
+        with transaction.atomic():
+            # Отметки снимаются до чтения событий: удаление события
+            # после чтения снова отметит рецепт.
+            RankingChange.objects.filter(recipe_id__in=chunk).delete()
+            events = window_events(chunk, start)
+            RecipeRanking.objects.filter(recipe_id__in=chunk).delete()
+            RecipeRanking.objects.bulk_create(
+                RecipeRanking(
+                    recipe_id=recipe_id,
+                    trending_score=trending_score(recipe_events)
+                )
+                for recipe_id, recipe_events in events.items()
+            )
+    RankingRefresh.objects.update_or_create(
+        pk=1, defaults={'refreshed_at': now}
+    )
+    return len(recipe_ids)
@@ -0,0 +1,55 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, When
+
+from .constants import SEARCH_CONFIG
+
+
+def is_postgresql(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def recipe_search_vector():
+    """Поисковый вектор рецепта: название весомее описания."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(queryset):
+    """Пересчет поискового вектора для рецептов выборки."""
+    if is_postgresql(queryset):
+        queryset.update(search_vector=recipe_search_vector())
+
+
+def search_recipes(queryset, value):
+    """
+    Полнотекстовый поиск по названию и описанию с ранжированием
+    по релевантности. Опечатки в названии находит триграммный поиск.
+    В других СУБД используется поиск по подстроке.
+    """
+    if not is_postgresql(queryset):
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        ).annotate(
+            rank=Case(
+                When(name__icontains=value, then=1),
+                default=0,
+                output_field=IntegerField(),
+            )
+        ).order_by('-rank', '-id')
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(
+        Q(search_vector=query) | Q(name__trigram_similar=value)
+    ).annotate(
+        rank=(
+            SearchRank(F('search_vector'), query)
+            + TrigramSimilarity('name', value)
+        )
+    ).order_by('-rank', '-id')
@@ -0,0 +1,111 @@
+from django.db import connection
+from django.db.models import Sum
+
+from .models import IngredientInRecipe, ShoppingCart, ShoppingListItem
+
+
+LIST_TABLE = ShoppingListItem._meta.db_table
+CART_TABLE = ShoppingCart._meta.db_table
+INGREDIENTS_TABLE = IngredientInRecipe._meta.db_table
+
+UPSERT_SQL = (
+    f'INSERT INTO {LIST_TABLE} (user_id, ingredient_id, amount) '
+    '{select} '
+    'ON CONFLICT (user_id, ingredient_id) '
+    f'DO UPDATE SET amount = {LIST_TABLE}.amount + EXCLUDED.amount'
+)
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def delete_empty_items(where, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {LIST_TABLE} WHERE amount <= 0 AND {where}',
+            params
+        )
+
+
+def change_recipes(user_id, recipe_ids, sign):
+    """Добавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    select = (
+        'SELECT %s, ingredient_id, %s * SUM(amount) '
+        f'FROM {INGREDIENTS_TABLE} '
+        f'WHERE recipe_id IN ({placeholders(recipe_ids)}) '
+        'GROUP BY ingredient_id'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(select=select),
+            [user_id, sign, *recipe_ids]
+        )
+    if sign < 0:
+        delete_empty_items('user_id = %s', [user_id])
+
+
+def add_recipes(user_id, recipe_ids):
+    """Рецепты добавлены в корзину пользователя."""
+    change_recipes(user_id, recipe_ids, 1)
+
+
+def remove_recipes(user_id, recipe_ids):
+    """Рецепты удалены из корзины пользователя."""
+    change_recipes(user_id, recipe_ids, -1)
+
+
+def change_recipe_ingredients(recipe_id, deltas):
+    """
+    Ингредиенты рецепта изменились: deltas - словарь
+    {id ингредиента: изменение количества} для всех пользователей,
+    у которых рецепт в корзине.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not deltas:
+        return
+    select = (
+        f'SELECT user_id, %s, %s FROM {CART_TABLE} WHERE recipe_id = %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            UPSERT_SQL.format(select=select),
+            [
+                [ingredient_id, delta, recipe_id]
+                for ingredient_id, delta in deltas.items()
+            ]
+        )
+    decreased = [
+        ingredient_id for ingredient_id, delta in deltas.items() if delta < 0
+    ]
+    if decreased:
+        delete_empty_items(
+            f'ingredient_id IN ({placeholders(decreased)})', decreased
+        )
+
+
+def rebuild(user_ids):
+    """Пересчитывает списки покупок пользователей по их корзинам."""
+    user_ids = list(user_ids)
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    totals = (
+        IngredientInRecipe.objects
+        .filter(recipe__cart__user_id__in=user_ids)
+        .values('recipe__cart__user_id', 'ingredient_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=item['recipe__cart__user_id'],
+            ingredient_id=item['ingredient_id'],
+            amount=item['total'],
+        )
+        for item in totals
+    )
@@ -0,0 +1,117 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import Subscribe
+
+from .catalog import bump_catalog_version
+from .constants import INGREDIENTS_CATALOG, TAGS_CATALOG
+from .counters import (
+    USER_RECIPE_COUNTERS, change_recipe_counter, change_user_counter
+)
+from .feed import backfill, publish, subscriber_removed, trim
+from .models import (
+    Favorite, Ingredient, IngredientInRecipe, Recipe, ShoppingCart, Tag
+)
+from .pantry import recipes_changed
+from .ranking import mark_ranking_changed
+from .search import update_search_vector
+from .shopping_list import add_recipes, remove_recipes
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Отмечает изменение справочника ингредиентов."""
+    bump_catalog_version(INGREDIENTS_CATALOG)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    """Отмечает изменение справочника тегов."""
+    bump_catalog_version(TAGS_CATALOG)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """Отмечает изменение состава рецепта."""
+    recipes_changed([instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields, **kwargs):
+    """Обновляет поисковый вектор при изменении названия или описания."""
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    update_search_vector(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_item_added(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в список покупок."""
+    if created:
+        add_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def cart_item_deleted(sender, instance, **kwargs):
+    """
+    Вычитает ингредиенты рецепта из списка покупок.
+    Вызывается до удаления, так как при каскадном удалении рецепта
+    его ингредиенты могут быть удалены раньше корзины.
+    """
+    remove_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def user_recipe_added(sender, instance, created, **kwargs):
+    """Увеличивает счетчик добавлений рецепта."""
+    if created:
+        change_recipe_counter(
+            [instance.recipe_id], USER_RECIPE_COUNTERS[sender], 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def user_recipe_deleted(sender, instance, **kwargs):
+    """
+    Уменьшает счетчик добавлений рецепта и отмечает рецепт
+    для пересчета рейтинга трендов.
+    """
+    change_recipe_counter(
+        [instance.recipe_id], USER_RECIPE_COUNTERS[sender], -1
+    )
+    mark_ranking_changed([instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    """Увеличивает счетчик рецептов автора и рассылает рецепт в ленты."""
+    if created:
+        change_user_counter([instance.author_id], 'recipes_count', 1)
+        publish(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Уменьшает счетчик рецептов автора."""
+    change_user_counter([instance.author_id], 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def subscription_created(sender, instance, created, **kwargs):
+    """Увеличивает счетчик подписчиков автора и заполняет ленту."""
+    if created:
+        change_user_counter([instance.author_id], 'subscribers_count', 1)
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscription_deleted(sender, instance, **kwargs):
+    """Уменьшает счетчик подписчиков автора и очищает ленту."""
+    change_user_counter([instance.author_id], 'subscribers_count', -1)
+    trim(instance.user_id, instance.author_id)
+    subscriber_removed(instance.author_id)
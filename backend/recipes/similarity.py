@@ -0,0 +1,199 @@
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from scipy import sparse
+
+from .constants import SIMILAR_RECIPES_COUNT, SIMILAR_TAG_WEIGHT
+from .models import IngredientInRecipe, Recipe, SimilarRecipe
+
+
+SIMILAR_TABLE = SimilarRecipe._meta.db_table
+RecipeTag = Recipe.tags.through
+
+
+class RecipeVectors:
+    """
+    Векторы рецептов: наличие ингредиентов и тегов, нормированные
+    по длине, так что скалярное произведение векторов равно
+    косинусной близости. Ингредиенты хранятся разреженной матрицей,
+    теги - плотной: тегов мало, но они есть почти у всех рецептов.
+    """
+
+    def __init__(self, ingredient_rows, tag_rows):
+        ingredient_rows = np.asarray(ingredient_rows, dtype=np.int64)
+        tag_rows = np.asarray(tag_rows, dtype=np.int64)
+        ingredient_rows = ingredient_rows.reshape(-1, 2)
+        tag_rows = tag_rows.reshape(-1, 2)
+        self.ids, rows = np.unique(
+            np.concatenate([ingredient_rows[:, 0], tag_rows[:, 0]]),
+            return_inverse=True
+        )
+        ingredient_recipes = rows[:len(ingredient_rows)]
+        tag_recipes = rows[len(ingredient_rows):]
+        _, ingredient_columns = np.unique(
+            ingredient_rows[:, 1], return_inverse=True
+        )
+        _, tag_columns = np.unique(tag_rows[:, 1], return_inverse=True)
+        size = len(self.ids)
+        self.ingredients = sparse.csr_matrix(
+            (
+                np.ones(len(ingredient_rows)),
+                (ingredient_recipes, ingredient_columns)
+            ),
+            shape=(size, ingredient_columns.max(initial=-1) + 1)
+        )
+        self.tags = np.zeros((size, tag_columns.max(initial=-1) + 1))
+        self.tags[tag_recipes, tag_columns] = SIMILAR_TAG_WEIGHT
+        norms = np.sqrt(
+            np.asarray(self.ingredients.sum(axis=1)).ravel()
+            + (self.tags ** 2).sum(axis=1)
+        )
+        norms[norms == 0] = 1
+        self.ingredients = sparse.diags(1 / norms) @ self.ingredients
+        self.tags /= norms[:, None]
+
+    @classmethod
+    def load(cls, recipe_ids=None):
+        """Векторы всех рецептов или рецептов из recipe_ids."""
+        ingredients = IngredientInRecipe.objects.all()
+        tags = RecipeTag.objects.all()
+        if recipe_ids is not None:
+            ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+            tags = tags.filter(recipe_id__in=recipe_ids)
+        return cls(
+            list(ingredients.values_list('recipe_id', 'ingredient_id')),
+            list(tags.values_list('recipe_id', 'tag_id')),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def similarity(self, start, stop):
+        """
+        Близость рецептов строк start:stop ко всем рецептам, с которыми
+        у них есть общие ингредиенты. Вклад тегов добавляется только
+        к этим парам, иначе матрица стала бы плотной.
+        """
+        scores = (self.ingredients[start:stop] @ self.ingredients.T).tocoo()
+        scores.data += np.einsum(
+            'ij,ij->i',
+            self.tags[start + scores.row],
+            self.tags[scores.col]
+        )
+        return scores.tocsr()
+
+    def neighbours(self, start, stop, count=SIMILAR_RECIPES_COUNT):
+        """
+        Ближайшие рецепты для строк start:stop:
+        список (id рецепта, id похожего, близость).
+        """
+        scores = self.similarity(start, stop)
+        result = []
+        for row in range(stop - start):
+            begin, end = scores.indptr[row], scores.indptr[row + 1]
+            columns = scores.indices[begin:end]
+            values = scores.data[begin:end]
+            mask = (columns != start + row) & (values > 0)
+            columns, values = columns[mask], values[mask]
+            if len(values) > count:
+                top = np.argpartition(-values, count)[:count]
+                columns, values = columns[top], values[top]
+            recipe_id = int(self.ids[start + row])
+            result.extend(
+                (recipe_id, int(self.ids[column]), float(value))
+                for column, value in zip(columns, values)
+            )
+        return result
+
+
+def save_neighbours(recipe_ids, rows):
+    """Заменяет похожие рецепты для recipe_ids строками rows."""
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=recipe_ids).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score)
+            for recipe_id, similar_id, score in rows
+        )
+
+
+def trim_neighbours(recipe_ids, count=SIMILAR_RECIPES_COUNT):
+    """Оставляет у рецептов recipe_ids не более count похожих."""
+    if not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SIMILAR_TABLE} WHERE id IN ('
+            'SELECT id FROM ('
+            'SELECT id, ROW_NUMBER() OVER ('
+            'PARTITION BY recipe_id ORDER BY score DESC, similar_id DESC'
+            f') AS position FROM {SIMILAR_TABLE} '
+            f'WHERE recipe_id IN ({placeholders})'
+            ') ranked WHERE position > %s)',
+            [*recipe_ids, count]
+        )
+
+
+def update_similar_recipes(recipe_id, count=SIMILAR_RECIPES_COUNT):
+    """
+    Пересчитывает похожие рецепты после изменения состава рецепта.
+    Сравнение идет только с рецептами, у которых есть общие
+    ингредиенты. Рецепт добавляется в списки тех из них, в которые
+    он теперь проходит, и удаляется из списков остальных.
+    """
+    candidate_ids = set(
+        IngredientInRecipe.objects.filter(
+            ingredient__in=IngredientInRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).values('ingredient_id')
+        ).values_list('recipe_id', flat=True).distinct()
+    )
+    candidate_ids.add(recipe_id)
+    vectors = RecipeVectors.load(candidate_ids)
+    ids = vectors.ids.tolist()
+    scores = {}
+    if recipe_id in ids:
+        row = ids.index(recipe_id)
+        scores = {
+            similar_id: score
+            for _, similar_id, score in vectors.neighbours(
+                row, row + 1, count=len(ids)
+            )
+        }
+    own = sorted(
+        scores.items(), key=lambda item: (-item[1], -item[0])
+    )[:count]
+    save_neighbours(
+        [recipe_id],
+        [(recipe_id, similar_id, score) for similar_id, score in own]
+    )
+    # Старая строка самого рецепта в размер и порог списка не входит:
+    # она заменяется новой с актуальной близостью.
+    lists = {
+        row['recipe_id']: row
+        for row in SimilarRecipe.objects.filter(recipe_id__in=scores)
+        .exclude(similar_id=recipe_id)
+        .values('recipe_id')
+        .annotate(size=Count('id'), lowest=Min('score'))
+        .order_by()
+    }
+    entered = [
+        similar_id for similar_id, score in scores.items()
+        if similar_id not in lists
+        or lists[similar_id]['size'] < count
+        or score > lists[similar_id]['lowest']
+    ]
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(similar_id=recipe_id).exclude(
+            recipe_id__in=entered
+        ).delete()
+        SimilarRecipe.objects.filter(
+            recipe_id__in=entered, similar_id=recipe_id
+        ).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=similar_id, similar_id=recipe_id,
+                          score=scores[similar_id])
+            for similar_id in entered
+        )
+        trim_neighbours(entered, count)
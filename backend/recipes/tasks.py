@@ -0,0 +1,37 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+# Фоновые задачи выполняются по очереди в одном потоке процесса.
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recipes')
+
+
+def execute(task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', task)
+
+
+def run(task, *args):
+    try:
+        execute(task, *args)
+    finally:
+        connections.close_all()
+
+
+def run_after_commit(task, *args):
+    """
+    Выполняет task(*args) в фоновом потоке после фиксации транзакции.
+    Очередь хранится в памяти процесса: задачи, не выполненные
+    до его остановки, теряются. В SQLite писать может только одно
+    соединение, поэтому там задача выполняется сразу в том же потоке.
+    """
+    if connection.vendor == 'sqlite':
+        transaction.on_commit(lambda: execute(task, *args))
+    else:
+        transaction.on_commit(lambda: executor.submit(run, task, *args))
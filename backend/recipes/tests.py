@@ -0,0 +1,102 @@
+from rest_framework.test import APITestCase
+
+from users.models import Subscribe, User
+
+from .models import Favorite, FeedEntry, Recipe, RecipeRanking
+from .ranking import refresh_trending
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com',
+        username=f'user{number}',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password-123',
+    )
+
+
+class TrendingRefreshTests(APITestCase):
+    """Инкрементальный пересчет учитывает удаленные события."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(3)]
+        cls.recipe = Recipe.objects.create(
+            author=cls.users[0],
+            name='Рецепт',
+            text='Описание',
+            cooking_time=10,
+            image='recipes/images/recipe.gif',
+        )
+
+    def get_score(self):
+        ranking = RecipeRanking.objects.filter(recipe=self.recipe).first()
+        return ranking and ranking.trending_score
+
+    def favorite(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+
+    def unfavorite(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.id}/favorite/'
+        )
+        self.assertEqual(response.status_code, 204)
+
+    def test_unfavorite_lowers_score(self):
+        self.favorite(self.users[1])
+        self.favorite(self.users[2])
+        refresh_trending()
+        score = self.get_score()
+        self.unfavorite(self.users[2])
+        refresh_trending()
+        self.assertLess(self.get_score(), score)
+        self.unfavorite(self.users[1])
+        refresh_trending()
+        self.assertIsNone(self.get_score())
+
+    def test_orm_delete_lowers_score(self):
+        self.favorite(self.users[1])
+        refresh_trending()
+        self.assertIsNotNone(self.get_score())
+        Favorite.objects.filter(recipe=self.recipe).delete()
+        refresh_trending()
+        self.assertIsNone(self.get_score())
+
+
+class FeedFallbackTests(APITestCase):
+    """Рецепты, не разосланные по лентам, читаются при запросе ленты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = create_user(0), create_user(1)
+        Subscribe.objects.create(user=cls.user, author=cls.author)
+
+    def create_recipe(self):
+        return Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            text='Описание',
+            cooking_time=10,
+            image='recipes/images/recipe.gif',
+        )
+
+    def get_feed(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_lost_fan_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            delivered = self.create_recipe()
+        # Рассылка после фиксации не выполнена, как при перезапуске.
+        lost = self.create_recipe()
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('recipe_id', flat=True)),
+            [delivered.id]
+        )
+        self.assertEqual(self.get_feed(), [lost.id, delivered.id])
@@ -0,0 +1,62 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import shopping_list
+from .counters import USER_RECIPE_COUNTERS, change_recipe_counter
+from .models import Recipe, ShoppingCart
+from .ranking import mark_ranking_changed
+from .shopping_list import placeholders
+
+
+RECIPE_TABLE = Recipe._meta.db_table
+
+
+def add_user_recipes(model, user_id, recipe_ids):
+    """
+    Добавляет рецепты в избранное или корзину одним запросом.
+    Уже добавленные и несуществующие рецепты пропускаются.
+    Возвращает id добавленных рецептов.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return []
+    table = model._meta.db_table
+    created = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, recipe_id, created) '
+            f'SELECT %s, id, %s FROM {RECIPE_TABLE} '
+            f'WHERE id IN ({placeholders(recipe_ids)}) '
+            'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+            'RETURNING recipe_id',
+            [user_id, created, *recipe_ids]
+        )
+        added = [row[0] for row in cursor.fetchall()]
+        change_recipe_counter(added, USER_RECIPE_COUNTERS[model], 1)
+        if model is ShoppingCart:
+            shopping_list.add_recipes(user_id, added)
+    return added
+
+
+def remove_user_recipes(model, user_id, recipe_ids):
+    """
+    Удаляет рецепты из избранного или корзины одним запросом.
+    Возвращает id удаленных рецептов.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return []
+    table = model._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE user_id = %s '
+            f'AND recipe_id IN ({placeholders(recipe_ids)}) '
+            'RETURNING recipe_id',
+            [user_id, *recipe_ids]
+        )
+        removed = [row[0] for row in cursor.fetchall()]
+        change_recipe_counter(removed, USER_RECIPE_COUNTERS[model], -1)
+        mark_ranking_changed(removed)
+        if model is ShoppingCart:
+            shopping_list.remove_recipes(user_id, removed)
+    return removed
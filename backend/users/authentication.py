@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+
+
+def get_auth_revision_key(user_id):
+    return f'users:{user_id}:auth'
+
+
+class UserSnapshot:
+    """
+    Значения полей пользователя. Каждый запрос получает из снимка
+    новый объект, поэтому изменения объекта в одном запросе
+    не видны другим.
+    """
+
+    def __init__(self, user):
+        self.model = type(user)
+        self.db = user._state.db
+        self.pk = user.pk
+        self.field_names = [
+            field.attname for field in self.model._meta.concrete_fields
+        ]
+        self.values = [getattr(user, name) for name in self.field_names]
+
+    def restore(self):
+        return self.model.from_db(self.db, self.field_names, self.values)
+
+
+class TokenCache:
+    """
+    LRU токен -> снимок пользователя с ограниченным временем жизни.
+
+    Кэш свой в каждом процессе. Чтобы выход, смена пароля или
+    блокировка действовали во всех процессах сразу, у пользователя
+    есть ревизия в общем кэше Django: она меняется при сбросе,
+    и записи со старой ревизией считаются промахом.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Пользователь по токену, восстановленный из снимка, или None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] <= monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is not None:
+            snapshot, _, revision = entry
+            if cache.get(get_auth_revision_key(snapshot.pk)) == revision:
+                with self.lock:
+                    self.hits += 1
+                return snapshot.restore()
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, user):
+        revision = cache.get(get_auth_revision_key(user.pk))
+        with self.lock:
+            self.entries[key] = (
+                UserSnapshot(user), monotonic() + self.ttl, revision
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        """Сбрасывает все токены пользователя во всех процессах."""
+        cache.set(get_auth_revision_key(user_id), uuid4().hex, timeout=None)
+        with self.lock:
+            for key in [
+                key for key, (snapshot, _, _) in self.entries.items()
+                if snapshot.pk == user_id
+            ]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'max_size': self.size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без запроса к базе, если токен
+    есть в кэше процесса. В этом случае request.auth - ключ
+    токена, а не объект Token.
+
+    Кэш используется только для чтения: изменяющие запросы могут
+    сохранить request.user, поэтому получают свежую копию из базы.
+    """
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if getattr(self, 'use_cache', True):
+            user = token_cache.get(key)
+            if user is not None:
+                return user, key
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        token_cache.set(key, token.user)
+        return token.user, token
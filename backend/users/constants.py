@@ -2,3 +2,4 @@ EMAIL_LEN = 254
 PASSWORD_LEN = 150
 FIRST_NAME_LEN = 150
 LAST_NAME_LEN = 150
+COUNTER_FIELDS = ('recipes_count', 'subscribers_count')
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:46
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+# FEED_CELEBRITY_SUBSCRIBERS на момент миграции.
+CELEBRITY_SUBSCRIBERS = 10000
+
+
+def set_feed_before(apps, schema_editor):
+    """
+    Граница ленты для существующих подписок: самый старый рецепт
+    автора в ленте подписчика, а если в ленте рецептов автора нет -
+    следующий за последним рецептом автора id.
+    """
+    Subscribe = apps.get_model('users', 'Subscribe')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    oldest_entry = models.Subquery(
+        FeedEntry.objects.filter(
+            user_id=models.OuterRef('user_id'),
+            author_id=models.OuterRef('author_id')
+        ).order_by('recipe_id').values('recipe_id')[:1]
+    )
+    latest_recipe = models.Subquery(
+        Recipe.objects.filter(
+            author_id=models.OuterRef('author_id')
+        ).order_by('-id').values('id')[:1]
+    )
+    Subscribe.objects.filter(
+        author__subscribers_count__lt=CELEBRITY_SUBSCRIBERS
+    ).update(feed_before=Coalesce(oldest_entry, latest_recipe + 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+        ('recipes', '0009_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscribe',
+            name='feed_before',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Рецепты автора с меньшим id не добавлены в ленту подписчика и читаются при запросе ленты.', null=True, verbose_name='Граница ленты'),
+        ),
+        migrations.RunPython(set_feed_before, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 from .constants import (
+    COUNTER_FIELDS,
     EMAIL_LEN,
     PASSWORD_LEN,
     FIRST_NAME_LEN,
@@ -33,6 +34,16 @@ class User(AbstractUser):
         max_length=LAST_NAME_LEN,
         help_text=f'Обязательное поле. Не более {LAST_NAME_LEN} символов.'
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
@@ -47,6 +58,26 @@ class User(AbstractUser):
     def __str__(self):
         return self.get_username()
 
+    def save(self, *args, **kwargs):
+        """
+        Счетчики меняются атомарными UPDATE с F(), поэтому полное
+        сохранение существующего пользователя их не перезаписывает:
+        в объекте могут быть устаревшие значения.
+        """
+        if (
+            kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Subscribe(models.Model):
     """Модель подписки."""
@@ -63,6 +94,14 @@ class Subscribe(models.Model):
         related_name='subscriber',
         verbose_name='Подписчик'
     )
+    feed_before = models.PositiveBigIntegerField(
+        'Граница ленты',
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Рецепты автора с меньшим id не добавлены в ленту '
+                  'подписчика и читаются при запросе ленты.'
+    )
 
     class Meta:
         ordering = ['author__id']
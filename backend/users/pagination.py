@@ -1,4 +1,14 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
 
 
 class CustomPageNumberPagination(PageNumberPagination):
@@ -6,3 +16,126 @@ class CustomPageNumberPagination(PageNumberPagination):
 
     page_query_param = 'page'
     page_size_query_param = 'limit'
+
+
+def get_approximate_count(queryset):
+    """
+    Оценка числа строк выборки по статистике планировщика PostgreSQL.
+    Для других СУБД оценка недоступна и возвращается None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация: стоимость глубоких страниц не зависит от номера,
+    так как вместо COUNT(*) и OFFSET используется условие по ключу.
+    Приблизительное общее число записей возвращается по запросу
+    параметра count=approximate.
+    """
+
+    ordering = '-id'
+    page_size_query_param = 'limit'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.count = get_approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Порядок задается атрибутом cursor_ordering вьюсета. Выборку,
+        уже упорядоченную иначе (по релевантности поиска, популярности
+        или трендам), курсор по этому порядку перемешал бы, поэтому
+        такой запрос отклоняется.
+        """
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+        if queryset.query.order_by and (
+            tuple(queryset.query.order_by) != ordering
+        ):
+            raise ValidationError({
+                'pagination': 'Курсорная пагинация недоступна '
+                              'для выбранной сортировки.'
+            })
+        return ordering
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class IdCursorPagination(CustomCursorPagination):
+    """
+    Курсорная пагинация по id для выборок, которые строятся
+    не одним запросом: страница id загружается функцией
+    load_ids(before, limit), курсор хранит последний id страницы.
+    """
+
+    def paginate_ids(self, load_ids, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None and cursor.position is not None:
+            try:
+                before = int(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        ids = load_ids(before, self.page_size + 1)
+        self.has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        self.next_position = ids[-1] if self.has_next else None
+        return ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=str(self.next_position))
+        )
+
+    def get_previous_link(self):
+        return None
+
+
+class CursorPaginationMixin:
+    """
+    Миксин вьюсета: включает курсорную пагинацию
+    по параметру запроса pagination=cursor.
+    """
+
+    cursor_pagination_class = CustomCursorPagination
+    cursor_ordering = '-id'
+    pagination_mode_query_param = 'pagination'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            mode = self.request.query_params.get(
+                self.pagination_mode_query_param
+            )
+            if mode == 'cursor':
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
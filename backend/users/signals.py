@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, created=False, update_fields=None,
+                 **kwargs):
+    """
+    Сброс кэша токенов при изменении или удалении пользователя:
+    смена пароля или is_active действует со следующего запроса.
+    """
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: token_cache.invalidate_user(user_id))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Сброс кэша токенов пользователя при выходе."""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: token_cache.invalidate_user(user_id))
@@ -0,0 +1,50 @@
+from django.db import connection, transaction
+
+from recipes.counters import change_user_counter
+from recipes.feed import backfill, subscriber_removed, trim
+
+from .models import Subscribe
+
+
+SUBSCRIBE_TABLE = Subscribe._meta.db_table
+
+
+def subscribe(user_id, author_id):
+    """
+    Создает подписку одним запросом, полагаясь на ограничение
+    уникальности, и добавляет рецепты автора в ленту подписчика.
+    Возвращает False, если подписка уже была.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {SUBSCRIBE_TABLE} (user_id, author_id) '
+            'VALUES (%s, %s) '
+            'ON CONFLICT (author_id, user_id) DO NOTHING '
+            'RETURNING id',
+            [user_id, author_id]
+        )
+        created = cursor.fetchone() is not None
+        if created:
+            change_user_counter([author_id], 'subscribers_count', 1)
+            backfill(user_id, author_id)
+    return created
+
+
+def unsubscribe(user_id, author_id):
+    """
+    Удаляет подписку и рецепты автора из ленты подписчика.
+    Возвращает False, если подписки не было.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SUBSCRIBE_TABLE} '
+            'WHERE user_id = %s AND author_id = %s '
+            'RETURNING id',
+            [user_id, author_id]
+        )
+        deleted = cursor.fetchone() is not None
+        if deleted:
+            change_user_counter([author_id], 'subscribers_count', -1)
+            trim(user_id, author_id)
+            subscriber_removed(author_id)
+    return deleted
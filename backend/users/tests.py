@@ -0,0 +1,157 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+
+from .authentication import token_cache
+from .models import Subscribe, User
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com',
+        username=f'user{number}',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password-123',
+    )
+
+
+class UserQueryCountTests(APITestCase):
+    """
+    Число запросов к БД для списка, профиля и /users/me/ не зависит
+    от числа пользователей, а хэш пароля из таблицы не читается.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *cls.authors = [create_user(number) for number in range(8)]
+        Subscribe.objects.create(user=cls.user, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+
+    def assert_no_password(self, queries):
+        for query in queries:
+            self.assertNotIn('"password"', query['sql'])
+
+    def test_list(self):
+        for authenticated in (False, True):
+            with self.subTest(authenticated=authenticated):
+                self.client.force_authenticate(
+                    self.user if authenticated else None
+                )
+                with self.assertNumQueries(2) as context:
+                    response = self.client.get('/api/users/')
+                self.assertEqual(response.status_code, 200)
+                self.assert_no_password(context.captured_queries)
+                subscribed = {
+                    item['id'] for item in response.data['results']
+                    if item['is_subscribed']
+                }
+                self.assertEqual(
+                    subscribed,
+                    {self.authors[0].id} if authenticated else set()
+                )
+
+    def test_profile(self):
+        url = f'/api/users/{self.authors[0].id}/'
+        for authenticated in (False, True):
+            with self.subTest(authenticated=authenticated):
+                self.client.force_authenticate(
+                    self.user if authenticated else None
+                )
+                with self.assertNumQueries(1) as context:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assert_no_password(context.captured_queries)
+                self.assertEqual(
+                    response.data['is_subscribed'], authenticated
+                )
+
+    def test_me(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.user.id)
+        self.assertFalse(response.data['is_subscribed'])
+        self.assertNotIn('password', response.data)
+
+
+class SubscriptionsTests(APITestCase):
+    """Подписки с последними рецептами авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other = [
+            create_user(number) for number in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/recipe.gif',
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get_recipe_ids(self, recipes_limit):
+        response = self.client.get(
+            '/api/users/subscriptions/',
+            {'recipes_limit': recipes_limit}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            [recipe['id'] for recipe in author['recipes']]
+            for author in response.data['results']
+        ]
+
+    def test_no_subscriptions(self):
+        self.assertEqual(self.get_recipe_ids(3), [])
+
+    def test_recipes_limit(self):
+        Subscribe.objects.create(user=self.user, author=self.author)
+        Subscribe.objects.create(user=self.user, author=self.other)
+        latest = [recipe.id for recipe in reversed(self.recipes)]
+        self.assertEqual(self.get_recipe_ids(2), [latest[:2], []])
+        self.assertEqual(self.get_recipe_ids(0), [latest, []])
+
+
+class TokenCacheTests(APITestCase):
+    """Запросы получают из кэша токенов независимые объекты."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_user(0)
+
+    def test_isolated_instances(self):
+        self.user._prefetched_objects_cache = {}
+        token_cache.set('key', self.user)
+        first = token_cache.get('key')
+        first.first_name = 'Другое'
+        first._state.fields_cache['marker'] = True
+        first._prefetched_objects_cache = getattr(
+            first, '_prefetched_objects_cache', {}
+        )
+        first._prefetched_objects_cache['groups'] = []
+        second = token_cache.get('key')
+        self.assertIsNot(first, second)
+        self.assertIsNot(first._state, second._state)
+        self.assertEqual(second.first_name, self.user.first_name)
+        self.assertNotIn('marker', second._state.fields_cache)
+        self.assertNotIn(
+            'groups', getattr(second, '_prefetched_objects_cache', {})
+        )
+        self.assertFalse(second._state.adding)
+        self.assertEqual(second._state.db, 'default')
+        self.assertEqual(second.pk, self.user.pk)
@@ -1,25 +1,97 @@
 from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField, Exists, F, OuterRef, Value, Window
+)
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from api.v1.serializers import CustomUserSerializer, SubscribeSerializer
+from api.v1.serializers import (
+    CustomUserSerializer,
+    SubscribeSerializer,
+    get_recipes_limit,
+)
+from api.v1.fieldsets import SparseFieldsetViewMixin, get_model_columns
+from api.v1.viewer import get_viewer_state
+from recipes.models import Recipe
 
+from .authentication import token_cache
 from .models import Subscribe
-from .pagination import CustomPageNumberPagination
+from .pagination import CursorPaginationMixin, CustomPageNumberPagination
+from .subscriptions import subscribe, unsubscribe
 
 
 User = get_user_model()
 
+PROFILE_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
 
-class CustomUserViewSet(UserViewSet):
+
+class CustomUserViewSet(SparseFieldsetViewMixin, CursorPaginationMixin,
+                        UserViewSet):
     """Переопределение базового вьюсета пользователя (Djoser)."""
 
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = CustomPageNumberPagination
+    cursor_ordering = 'id'
+    fieldset_actions = ('list', 'retrieve', 'me', 'subscriptions')
+
+    def get_columns(self, default):
+        """Загружаемые поля: все выводимые или только из fields."""
+        fields, _ = self.get_fieldset()
+        if fields is None:
+            return default
+        return ('id', *get_model_columns(User, fields))
+
+    def is_requested(self, name):
+        fields, _ = self.get_fieldset()
+        return fields is None or name in fields
+
+    def get_queryset(self):
+        """
+        Для списка и профиля пользователя is_subscribed вычисляется
+        в том же запросе подзапросом Exists, а из таблицы загружаются
+        только выводимые поля, без хэша пароля.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        queryset = queryset.only(*self.get_columns(PROFILE_FIELDS))
+        if not self.is_requested('is_subscribed'):
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            is_subscribed = Exists(
+                Subscribe.objects.filter(user=user, author=OuterRef('pk'))
+            )
+        else:
+            is_subscribed = Value(False, output_field=BooleanField())
+        return queryset.annotate(is_subscribed=is_subscribed)
+
+    def get_instance(self):
+        """
+        Текущий пользователь для /users/me/. На себя подписаться
+        нельзя, поэтому is_subscribed известен без запроса.
+        """
+        user = super().get_instance()
+        user.is_subscribed = False
+        return user
+
+    def get_serializer_class(self):
+        if self.action == 'subscriptions':
+            return SubscribeSerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        """Флаги подписки загружаются пакетно, см. RecipeViewSet."""
+        return {
+            **super().get_serializer_context(),
+            'viewer': get_viewer_state(self.request),
+        }
 
     def get_permissions(self):
         """Устанавливаем права доступа для отдельных запросов."""
@@ -27,38 +99,87 @@ class CustomUserViewSet(UserViewSet):
             'me', 'subscribe', 'delete_subscribe', 'subscriptions'
         ]:
             permission_classes = [permissions.IsAuthenticated]
+        elif self.action == 'auth_cache':
+            permission_classes = [permissions.IsAdminUser]
         else:
             permission_classes = [permissions.AllowAny]
         return [permission() for permission in permission_classes]
 
+    @action(methods=['get'], detail=False)
+    def auth_cache(self, request):
+        """Статистика кэша токенов обработавшего запрос процесса."""
+        return Response(token_cache.stats())
+
     @action(methods=['get'], detail=False)
     def subscriptions(self, request):
-        """Подписки."""
-        subscriptions = User.objects.filter(author__user=request.user)
+        """
+        Подписки. Число рецептов считается в том же запросе, а последние
+        recipes_limit рецептов всех авторов страницы загружаются одним
+        запросом с ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+        recipes_limit = get_recipes_limit(request)
+        subscriptions = User.objects.filter(
+            author__user=request.user
+        ).only(
+            *self.get_columns((*PROFILE_FIELDS, 'recipes_count'))
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
         pages = self.paginate_queryset(subscriptions)
-        serializer = SubscribeSerializer(
-            pages, many=True, context={'request': request}
-        )
+        if self.is_requested('recipes'):
+            self.attach_latest_recipes(pages, recipes_limit)
+        serializer = self.get_serializer(pages, many=True)
         return self.get_paginated_response(serializer.data)
 
+    def attach_latest_recipes(self, authors, limit):
+        """Сохраняет в latest_recipes авторов их последние рецепты."""
+        if not authors:
+            return
+        recipes = Recipe.objects.filter(
+            author__in=authors
+        ).only('id', 'name', 'image', 'cooking_time', 'author_id')
+        if limit is not None:
+            sql, params = recipes.annotate(
+                recipe_rank=Window(
+                    RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=F('id').desc(),
+                )
+            ).query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s '
+                'ORDER BY author_id, id DESC',
+                (*params, limit)
+            )
+        by_author = {author.id: [] for author in authors}
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = by_author[author.id]
+
     @action(methods=['post'], detail=True)
     def subscribe(self, request, **kwargs):
         """Подписаться."""
-        author_id = self.kwargs.get('id')
-        author = get_object_or_404(User, id=author_id)
+        author = get_object_or_404(User, id=self.kwargs.get('id'))
+        if request.user == author:
+            raise ValidationError({
+                'errors': 'Вы не можете подписаться на самого себя'
+            })
+        if not subscribe(request.user.id, author.id):
+            raise ValidationError({
+                'errors': 'Вы уже подписаны на этого пользователя'
+            })
         serializer = SubscribeSerializer(
-            author,
-            data=request.data,
-            context={'request': request},
+            author, context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        Subscribe.objects.create(user=request.user, author=author)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, **kwargs):
         """Отписаться."""
-        author_id = self.kwargs.get('id')
-        author = get_object_or_404(User, id=author_id)
-        get_object_or_404(Subscribe, user=request.user, author=author).delete()
+        author = get_object_or_404(User, id=self.kwargs.get('id'))
+        if not unsubscribe(request.user.id, author.id):
+            raise ValidationError({
+                'errors': 'Вы не подписаны на этого пользователя'
+            })
         return Response(status=status.HTTP_204_NO_CONTENT)